@@ -1,5 +1,14 @@
 __all__ = ['OwnerConfig', 'AppConfig', 'StorageConfig', 'SourceConfig', 'PMConfig', 'ConfigError', 'S3Config',
-           'LocalConfig']
+           'LocalConfig', 'FetcherConfig', 'GCConfig', 'AudioFormat']
 
-from podmaker.config.core import AppConfig, ConfigError, OwnerConfig, PMConfig, SourceConfig
+from podmaker.config.core import (
+    AppConfig,
+    AudioFormat,
+    ConfigError,
+    FetcherConfig,
+    GCConfig,
+    OwnerConfig,
+    PMConfig,
+    SourceConfig,
+)
 from podmaker.config.storage import LocalConfig, S3Config, StorageConfig
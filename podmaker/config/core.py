@@ -2,11 +2,12 @@ from __future__ import annotations
 
 import re
 import sys
+from datetime import date
 from pathlib import PurePath
 from typing import Literal, Optional, Union
 from urllib.parse import quote
 
-from pydantic import BaseModel, EmailStr, Field, HttpUrl, ValidationError
+from pydantic import BaseModel, EmailStr, Field, HttpUrl, ValidationError, field_validator, model_validator
 
 from podmaker.config.storage import LocalConfig, S3Config
 
@@ -25,14 +26,61 @@ class OwnerConfig(BaseModel):
 class AppConfig(BaseModel):
     mode: Literal['oneshot', 'watch'] = Field('oneshot', frozen=True)
     loglevel: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR'] = Field('INFO', frozen=True)
+    state_dir: Optional[PurePath] = Field(None, frozen=True)
 
 
+AudioFormat = Literal['mp3', 'm4a', 'opus']
+
+
+class FetcherConfig(BaseModel):
+    rescan_interval: int = Field(24 * 60 * 60, ge=0, frozen=True)
+    concurrency: int = Field(1, ge=1, frozen=True)
+    metadata_ttl: int = Field(1 * 60 * 60, ge=0, frozen=True)
+    metadata_max_ttl: int = Field(7 * 24 * 60 * 60, ge=0, frozen=True)
+    download_workers: int = Field(2, ge=1, frozen=True)
+    download_order: Literal['fifo', 'priority'] = Field('fifo', frozen=True)
+    audio_format: AudioFormat = Field('mp3', frozen=True)
+    bitrate: Optional[int] = Field(None, ge=8, frozen=True)
+    shared_audio: bool = Field(False, frozen=True)
+    work_dir_max_size: int = Field(10 * 1024 * 1024 * 1024, ge=0, frozen=True)
+    work_dir_max_age: int = Field(7 * 24 * 60 * 60, ge=0, frozen=True)
+    metadata_rate: float = Field(1, ge=0, frozen=True)
+    metadata_burst: int = Field(5, ge=1, frozen=True)
+    media_rate: float = Field(0.2, ge=0, frozen=True)
+    media_burst: int = Field(2, ge=1, frozen=True)
+    cache_dir: Optional[PurePath] = Field(None, frozen=True)
+    warm_up_url: Optional[HttpUrl] = Field(None, frozen=True)
+
+
+class GCConfig(BaseModel):
+    enabled: bool = Field(False, frozen=True)
+    interval: int = Field(24 * 60 * 60, ge=0, frozen=True)
+    grace_period: int = Field(7 * 24 * 60 * 60, ge=0, frozen=True)
+    dry_run: bool = Field(False, frozen=True)
+
+
+# noinspection PyNestedDecorators
 class SourceConfig(BaseModel):
     id: str = Field(min_length=1, frozen=True)
     name: Optional[str] = Field(None, min_length=1, frozen=True)
     regex: Optional[re.Pattern[str]] = Field(None, frozen=True)
     url: HttpUrl = Field(frozen=True)
     interval: int = Field(1 * 60 * 60, ge=1, frozen=True)
+    concurrency: Optional[int] = Field(None, ge=1, frozen=True)
+    max_episodes: Optional[int] = Field(None, ge=1, frozen=True)
+    since: Optional[date] = Field(None, frozen=True)
+    download_concurrency: Optional[int] = Field(None, ge=1, frozen=True)
+    priority: int = Field(0, frozen=True)
+    audio_format: Optional[AudioFormat] = Field(None, frozen=True)
+    bitrate: Optional[int] = Field(None, ge=8, frozen=True)
+
+    @field_validator('id')
+    @classmethod
+    def _check_id(cls, v: str) -> str:
+        # the prefix of the audio shared by sources
+        if v == '_shared':
+            raise ValueError('"_shared" is reserved')
+        return v
 
     def get_storage_key(self, key: str) -> str:
         return f'{quote(self.id)}/{key}'
@@ -47,6 +95,16 @@ class PMConfig(BaseModel):
     storage: Union[S3Config, LocalConfig] = Field(frozen=True)
     sources: tuple[SourceConfig, ...] = Field(frozen=True)
     app: AppConfig = Field(default_factory=AppConfig, frozen=True)
+    fetcher: FetcherConfig = Field(default_factory=FetcherConfig, frozen=True)
+    gc: GCConfig = Field(default_factory=GCConfig, frozen=True)
+
+    @model_validator(mode='after')
+    def _check_gc(self) -> PMConfig:
+        # the references to the shared audio are lost on restart without the state dir,
+        # then the audio still referenced by other sources would be deleted
+        if self.gc.enabled and self.fetcher.shared_audio and self.app.state_dir is None:
+            raise ValueError('gc of shared audio requires app.state_dir')
+        return self
 
     @classmethod
     def from_file(cls, path: PurePath) -> PMConfig:
@@ -1,5 +1,5 @@
 from pathlib import PurePath
-from typing import Literal
+from typing import Literal, Optional
 
 from pydantic import BaseModel, Field, HttpUrl
 
@@ -8,6 +8,10 @@ SupportedStorage = Literal['s3', 'local']
 
 class StorageConfig(BaseModel):
     dest: SupportedStorage = Field(min_length=1, frozen=True)
+    cache_size: int = Field(0, ge=0, frozen=True)
+    cache_ttl: int = Field(10 * 60, ge=0, frozen=True)
+    cache_negative_ttl: int = Field(60, ge=0, frozen=True)
+    precompress: list[Literal['gzip', 'br']] = Field([], frozen=True)
 
 
 class S3Config(StorageConfig):
@@ -17,9 +21,18 @@ class S3Config(StorageConfig):
     bucket: str = Field(min_length=1, frozen=True)
     endpoint: HttpUrl = Field(frozen=True)
     public_endpoint: HttpUrl = Field(frozen=True)
+    multipart_threshold: int = Field(16 * 1024 * 1024, ge=5 * 1024 * 1024, frozen=True)
+    multipart_chunk_size: int = Field(8 * 1024 * 1024, ge=5 * 1024 * 1024, frozen=True)
+    multipart_concurrency: int = Field(4, ge=1, frozen=True)
+    index_ttl: int = Field(60 * 60, ge=0, frozen=True)
+    single_writer: bool = Field(False, frozen=True)
+    cache_control: dict[str, str] = Field({}, frozen=True)
+    local_cache_dir: Optional[PurePath] = Field(None, frozen=True)
+    local_cache_size: int = Field(1024 * 1024 * 1024, ge=0, frozen=True)
 
 
 class LocalConfig(StorageConfig):
     dest: Literal['local'] = Field(frozen=True)
     base_dir: PurePath = Field(min_length=1, frozen=True)
     public_endpoint: HttpUrl = Field(frozen=True)
+    fsync: Literal['none', 'file', 'full'] = Field('file', frozen=True)
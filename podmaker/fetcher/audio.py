@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+__all__ = ['AudioProfile']
+
+import logging
+import subprocess
+from contextlib import contextmanager
+from dataclasses import dataclass
+from io import BufferedReader, RawIOBase
+from pathlib import Path
+from tempfile import TemporaryFile
+from typing import IO, Any, Iterator
+
+from podmaker.config import AudioFormat
+
+logger = logging.getLogger(__name__)
+
+# filters of the preferred audio streams, the native stream is kept without transcoding if it matches
+_format_filters = {
+    'mp3': '',
+    'm4a': '[ext=m4a]',
+    'opus': '[acodec=opus]',
+}
+_mime_types = {
+    'mp3': 'audio/mp3',
+    'm4a': 'audio/x-m4a',
+    'opus': 'audio/ogg',
+}
+
+
+class _ProcessStream(RawIOBase):
+    """
+    The stdout of a process, reading it raises an error at the end if the process failed,
+    so that a truncated output is never taken as a complete one.
+    """
+
+    def __init__(self, process: subprocess.Popen[bytes], stderr: IO[bytes]):
+        self._process = process
+        self._stderr = stderr
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if self._process.stdout is None:
+            raise ValueError('stdout of the process is not captured')
+        chunk = self._process.stdout.read(len(buffer))
+        if not chunk:
+            code = self._process.wait()
+            if code != 0:
+                self._stderr.seek(0)
+                raise RuntimeError(f'ffmpeg exited with {code}: {self._stderr.read().decode(errors="replace")}')
+        size = len(chunk)
+        buffer[:size] = chunk
+        return size
+
+
+class _TeeStream(RawIOBase):
+    """
+    A stream which copies the data read through it to a file,
+    the file is moved to its final path only if the stream is read to the end.
+    """
+
+    def __init__(self, stream: IO[bytes], path: Path):
+        self._stream = stream
+        self._path = path
+        self._part = _part_path(path)
+        self._file = open(self._part, 'wb')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        chunk = self._stream.read(len(buffer))
+        if chunk:
+            self._file.write(chunk)
+        elif not self._file.closed:
+            self._file.close()
+            self._part.replace(self._path)
+        size = len(chunk)
+        buffer[:size] = chunk
+        return size
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+def _part_path(path: Path) -> Path:
+    return path.with_name(f'{path.name}.part')
+
+
+def _ffmpeg_args(path: Path, args: list[str], output: str) -> list[str]:
+    return ['ffmpeg', '-nostdin', '-loglevel', 'error', '-y', '-i', str(path), '-vn', *args, output]
+
+
+@contextmanager
+def _stream(path: Path, args: list[str]) -> Iterator[IO[bytes]]:
+    with TemporaryFile() as stderr:
+        process = subprocess.Popen(_ffmpeg_args(path, args, 'pipe:1'), stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            yield BufferedReader(_ProcessStream(process, stderr))
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            if process.stdout is not None:
+                process.stdout.close()
+
+
+@contextmanager
+def _convert_file(path: Path, args: list[str], output: Path) -> Iterator[IO[bytes]]:
+    part = _part_path(output)
+    subprocess.run(_ffmpeg_args(path, [*args, '-f', 'mp4'], str(part)), check=True, capture_output=True)
+    part.replace(output)
+    with open(output, 'rb') as f:
+        yield f
+
+
+@dataclass(frozen=True)
+class AudioProfile:
+    """
+    How the audio is extracted from videos.
+    `mp3` is transcoded from the best audio stream,
+    `m4a` and `opus` keep the native audio stream and only remux it if the video provides such stream.
+    If a target bitrate in kbps is given, the smallest audio stream which reaches it is preferred to the best one,
+    and the transcoded audio is encoded at it.
+    """
+    format: AudioFormat
+    bitrate: int | None = None
+
+    @property
+    def ext(self) -> str:
+        return self.format
+
+    @property
+    def suffix(self) -> str:
+        """
+        The suffix of the audio files, it identifies the profile.
+        """
+        return f'{self.bitrate}k.{self.ext}' if self.bitrate else self.ext
+
+    @property
+    def mime_type(self) -> str:
+        return _mime_types[self.format]
+
+    @property
+    def format_selector(self) -> str:
+        selectors = []
+        for f in dict.fromkeys((_format_filters[self.format], '')):
+            if self.bitrate:
+                selectors.append(f'wa{f}[abr>={self.bitrate}]')
+            selectors.append(f'ba{f}')
+        return '/'.join(selectors)
+
+    @property
+    def ydl_opts(self) -> dict[str, Any]:
+        # partial downloads are resumed if the download dir is kept
+        return {'format': self.format_selector, 'continuedl': True}
+
+    def _encoder_args(self, codec: str) -> list[str]:
+        args = ['-c:a', codec]
+        if self.bitrate:
+            args += ['-b:a', f'{self.bitrate}k']
+        elif codec == 'libmp3lame':
+            args += ['-q:a', '5']
+        return args
+
+    @contextmanager
+    def convert(self, path: Path, codec: str | None, *, keep: bool = False) -> Iterator[IO[bytes]]:
+        """
+        Convert the downloaded audio to the format of the profile.
+        The output is streamed from ffmpeg if the container allows, otherwise it is written beside the input.
+
+        :param path: path of the downloaded audio
+        :param codec: codec of the downloaded audio
+        :param keep: keep the converted audio beside the input, it is reused by the next conversion of the input
+        """
+        output = path.with_name(f'{path.stem}.converted.{self.suffix}')
+        if output.exists():
+            logger.info(f'reuse the converted audio: {output}')
+            with open(output, 'rb') as f:
+                yield f
+        elif self.format == 'm4a' and path.suffix == '.m4a':
+            logger.debug(f'keep the native audio: {path}')
+            with open(path, 'rb') as f:
+                yield f
+        elif self.format == 'm4a':
+            # the mp4 muxer requires a seekable output
+            with _convert_file(path, self._encoder_args('aac'), output) as f:
+                yield f
+        else:
+            if self.format == 'mp3':
+                args = [*self._encoder_args('libmp3lame'), '-f', 'mp3']
+            else:
+                args = [*(['-c:a', 'copy'] if codec == 'opus' else self._encoder_args('libopus')), '-f', 'opus']
+            with _stream(path, args) as f:
+                if keep:
+                    with BufferedReader(_TeeStream(f, output)) as tee:
+                        yield tee
+                else:
+                    yield f
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+__all__ = ['MetadataCache']
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataCache:
+    """
+    A persistent cache of the metadata of videos, keyed by the id of the video.
+
+    The metadata of a video is revalidated after a TTL which grows with the age of the video,
+    recent videos are refreshed more often than old ones.
+    """
+    _db: sqlite3.Connection
+
+    def __init__(self, path: Path | None, ttl: timedelta, max_ttl: timedelta):
+        """
+        :param path: path of the database file, `None` to keep the cache in memory
+        :param ttl: the minimum TTL of the metadata, used by recent videos
+        :param max_ttl: the maximum TTL of the metadata, used by old videos
+        """
+        self.path = path
+        self.ttl = ttl.total_seconds()
+        self.max_ttl = max_ttl.total_seconds()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if self.path is None:
+            database = ':memory:'
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            database = str(self.path)
+        logger.info(f'open metadata cache: {database}')
+        with self._lock:
+            self._db = sqlite3.connect(database, check_same_thread=False)
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS metadata (
+                    id TEXT PRIMARY KEY,
+                    info TEXT NOT NULL,
+                    published_at REAL NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            ''')
+
+    def stop(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _get_ttl(self, published_at: float, now: float) -> float:
+        # a video published one day ago is revalidated every hour, one published 24 weeks ago every week, and so on
+        ttl = (now - published_at) / 24
+        return min(max(ttl, self.ttl), self.max_ttl)
+
+    def get(self, video_id: str) -> dict[str, Any] | None:
+        """
+        :return: the metadata of the video, `None` if it is not cached or has expired
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT info, published_at, fetched_at FROM metadata WHERE id = ?',
+                (video_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        info, published_at, fetched_at = row
+        now = time.time()
+        if now - fetched_at > self._get_ttl(published_at, now):
+            logger.debug(f'metadata expired: {video_id}')
+            return None
+        result: dict[str, Any] = json.loads(info)
+        return result
+
+    def put(self, video_id: str, info: dict[str, Any], published_at: datetime) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO metadata (id, info, published_at, fetched_at) VALUES (?, ?, ?, ?)',
+                (video_id, json.dumps(info), published_at.astimezone(timezone.utc).timestamp(), time.time()),
+            )
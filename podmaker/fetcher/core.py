@@ -1,16 +1,51 @@
 from abc import ABC, abstractmethod
+from typing import AbstractSet, Any, Callable
 
 from podmaker.config import SourceConfig
 from podmaker.rss import Podcast
 
+Hook = Callable[[SourceConfig], None]
+
+
+def _do_nothing(*_: Any) -> None:
+    pass
+
 
 class Fetcher(ABC):
+    def __init__(self) -> None:
+        # called when new episodes of the source are ready outside `fetch`, e.g. audio downloaded in background
+        self.on_ready: Hook = _do_nothing
+
     @abstractmethod
-    def fetch(self, source: SourceConfig) -> Podcast:
+    def fetch(self, source: SourceConfig, known_ids: AbstractSet[str] = frozenset()) -> Podcast:
+        """
+        :param known_ids: unique ids of the episodes that have been published, they may be skipped
+        """
         raise NotImplementedError
 
+    def shared_keys(self, source: SourceConfig) -> set[str]:
+        """
+        :return: keys of the objects referenced by the source which are shared with other sources,
+            they are stored outside the prefix of the source
+        """
+        return set()
+
+    def release(self, source: SourceConfig, key: str) -> bool:
+        """
+        Drop the reference of the source to a shared object.
+
+        :return: whether no source references the object any more, then it is safe to delete
+        """
+        return True
+
     def start(self) -> None:
         pass
 
     def stop(self) -> None:
         pass
+
+    def join(self) -> None:
+        """
+        Wait for the background work of the fetcher.
+        """
+        pass
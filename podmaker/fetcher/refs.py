@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+__all__ = ['AudioRefs']
+
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class AudioRefs:
+    """
+    A persistent record of the sources which reference shared audio objects,
+    an object is safe to delete only when no source references it.
+    """
+    _db: sqlite3.Connection
+
+    def __init__(self, path: Path | None):
+        """
+        :param path: path of the database file, `None` to keep the references in memory
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if self.path is None:
+            database = ':memory:'
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            database = str(self.path)
+        logger.info(f'open audio references: {database}')
+        with self._lock:
+            self._db = sqlite3.connect(database, check_same_thread=False)
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS refs (
+                    key TEXT NOT NULL,
+                    source_id TEXT NOT NULL,
+                    PRIMARY KEY (key, source_id)
+                )
+            ''')
+
+    def stop(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def add(self, key: str, source_id: str) -> None:
+        with self._lock, self._db:
+            self._db.execute('INSERT OR IGNORE INTO refs (key, source_id) VALUES (?, ?)', (key, source_id))
+
+    def remove(self, key: str, source_id: str) -> int:
+        """
+        :return: the number of sources which still reference the object, it is safe to delete if `0`
+        """
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM refs WHERE key = ? AND source_id = ?', (key, source_id))
+            row = self._db.execute('SELECT COUNT(*) FROM refs WHERE key = ?', (key,)).fetchone()
+        count: int = row[0]
+        return count
+
+    def keys(self, source_id: str) -> set[str]:
+        with self._lock:
+            rows = self._db.execute('SELECT key FROM refs WHERE source_id = ?', (source_id,)).fetchall()
+        return {key for key, in rows}
+
+    def sources(self, key: str) -> set[str]:
+        with self._lock:
+            rows = self._db.execute('SELECT source_id FROM refs WHERE key = ?', (key,)).fetchall()
+        return {source_id for source_id, in rows}
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+__all__ = ['WorkDir']
+
+import logging
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+def _get_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob('*') if p.is_file())
+
+
+class WorkDir:
+    """
+    A persistent directory of the downloads in progress, each download works in its own sub directory.
+
+    The sub directory is kept if the download fails, so that the next attempt resumes the partial files,
+    and it is removed once the download succeeds.
+    Stale sub directories are removed by age, then by size from the oldest one.
+    """
+
+    def __init__(self, path: Path | None, max_size: int, max_age: int):
+        """
+        :param path: path of the directory, `None` to use a temporary directory for each download without resuming
+        :param max_size: the maximum size of the directory in bytes, `0` for no limit
+        :param max_age: the maximum age of the sub directories in seconds, `0` for no limit
+        """
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        self._active: set[str] = set()
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def start(self) -> None:
+        if self.path is None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        logger.info(f'open work dir: {self.path}')
+        self.clean()
+
+    def clean(self) -> None:
+        """
+        Remove the stale sub directories, the active ones are kept.
+        """
+        if self.path is None:
+            return
+        with self._lock:
+            self._clean(self.path)
+
+    def _clean(self, path: Path) -> None:
+        entries = [p for p in path.iterdir() if p.is_dir() and p.name not in self._active]
+        now = time.time()
+        kept: list[tuple[float, int, Path]] = []
+        for entry in entries:
+            mtime = entry.stat().st_mtime
+            if self.max_age and now - mtime > self.max_age:
+                logger.info(f'remove stale download: {entry.name}')
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                kept.append((mtime, _get_size(entry), entry))
+        if not self.max_size:
+            return
+        total = sum(size for _, size, _ in kept)
+        for _, size, entry in sorted(kept):
+            if total <= self.max_size:
+                break
+            logger.info(f'remove download due to the size of work dir: {entry.name}')
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    @contextmanager
+    def acquire(self, name: str) -> Iterator[Path]:
+        """
+        :param name: name of the sub directory, the same name resumes the same download,
+                     it waits until the download in progress with the name is done
+        """
+        if self.path is None:
+            with TemporaryDirectory(prefix='podmaker_youtube_') as tmp_dir:
+                yield Path(tmp_dir)
+            return
+        with self._released:
+            if name in self._active:
+                logger.info(f'wait for the download in progress: {name}')
+                self._released.wait_for(lambda: name not in self._active)
+            self._active.add(name)
+        try:
+            self.clean()
+            path = self.path / name
+            path.mkdir(exist_ok=True)
+            yield path
+            shutil.rmtree(path, ignore_errors=True)
+        finally:
+            with self._released:
+                self._active.discard(name)
+                self._released.notify_all()
@@ -6,19 +6,27 @@ import logging
 import os
 import sys
 import tempfile
-from datetime import datetime, timedelta, timezone
-from functools import lru_cache
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, time, timedelta, timezone
 from inspect import isgenerator
-from tempfile import TemporaryDirectory
-from typing import Any, Iterable
+from pathlib import Path, PurePath
+from time import monotonic
+from typing import AbstractSet, Any, Callable, Generator, Iterable, Iterator, TypeVar
 from urllib.parse import ParseResult, urlparse
 
-from podmaker.config import OwnerConfig, SourceConfig
+from podmaker.config import FetcherConfig, OwnerConfig, SourceConfig
 from podmaker.fetcher import Fetcher
+from podmaker.fetcher.audio import AudioProfile
+from podmaker.fetcher.cache import MetadataCache
+from podmaker.fetcher.refs import AudioRefs
+from podmaker.fetcher.work_dir import WorkDir
 from podmaker.rss import Enclosure, Episode, Owner, Podcast, Resource
 from podmaker.rss.core import PlainResource
-from podmaker.storage import Storage
-from podmaker.util import exit_signal
+from podmaker.storage import ObjectInfo, Storage
+from podmaker.util import JobQueue, Pool, RateLimiter, SharedIterable, SingleFlight, exit_signal
 
 logger = logging.getLogger(__name__)
 
@@ -29,34 +37,260 @@ except ImportError:
     sys.exit(1)
 
 
+T = TypeVar('T')
+
+# number of retries of a request throttled by the upstream, the rate limiter backs off before each one
+_throttled_retries = 3
+
+# the namespace of the audio shared by sources, it is rejected as the id of a source by `SourceConfig`
+_shared_prefix = '_shared'
+
+# the metadata of videos that are used to build episodes, they are kept in the metadata cache
+_metadata_keys = ('id', 'title', 'description', 'duration', 'upload_date', 'webpage_url', 'thumbnail')
+
+
+def _parse_upload_date(video_info: dict[str, Any]) -> datetime:
+    return datetime.strptime(video_info['upload_date'], '%Y%m%d').replace(tzinfo=timezone.utc)
+
+
+def _is_throttled(e: BaseException) -> bool:
+    return isinstance(e, yt_dlp.DownloadError) and ('HTTP Error 429' in str(e) or 'Too Many Requests' in str(e))
+
+
+def _close_ydl(ydl: Any) -> None:
+    ydl.__exit__(None, None, None)
+
+
+def _close_after(ydl: Any, entries: Iterable[Any]) -> Iterator[dict[str, Any]]:
+    # the instance is also closed if the entries are dropped before being exhausted
+    try:
+        yield from entries
+    finally:
+        _close_ydl(ydl)
+
+
+def _is_newest_first(url: str) -> bool:
+    # channel tabs list the latest uploads first, the order of playlists is arbitrary
+    return urlparse(url).path != '/playlist'
+
+
 class YouTube(Fetcher):
-    def __init__(self, storage: Storage, owner_config: OwnerConfig | None):
+    def __init__(
+            self,
+            storage: Storage,
+            owner_config: OwnerConfig | None,
+            fetcher_config: FetcherConfig | None = None,
+            state_dir: PurePath | None = None,
+    ):
+        super().__init__()
         self.storage = storage
-        self.ydl_opts = {
+        self.ydl_opts: dict[str, Any] = {
             'logger': logging.getLogger('yt_dlp'),
             'cachedir': tempfile.gettempdir(),
         }
         self.owner_config = owner_config
+        self.fetcher_config = fetcher_config or FetcherConfig()
+        # YoutubeDL instances are reused to avoid initializing extractors and HTTP sessions for each call,
+        # there are no more instances than the requests which can be sent at once,
+        # each instance has its own copy of the options, which yt-dlp keeps as its params without copying them
+        self.metadata_pool: Pool[Any] = Pool(
+            lambda: yt_dlp.YoutubeDL(dict(self.ydl_opts)), _close_ydl, max_size=self.fetcher_config.metadata_burst)
+        self.download_pools: dict[AudioProfile, Pool[Any]] = {}
+        self._download_pools_lock = threading.Lock()
+        self.state_dir = Path(state_dir) / 'youtube' if state_dir else None
+        if self.fetcher_config.cache_dir:
+            self.cache_dir: Path | None = Path(self.fetcher_config.cache_dir)
+        else:
+            self.cache_dir = self.state_dir / 'cache' if self.state_dir else None
+        self.cache = MetadataCache(
+            self.state_dir / 'metadata.sqlite3' if self.state_dir else None,
+            ttl=timedelta(seconds=self.fetcher_config.metadata_ttl),
+            max_ttl=timedelta(seconds=self.fetcher_config.metadata_max_ttl),
+        )
+        self.work_dir = WorkDir(
+            self.state_dir / 'downloads' if self.state_dir else None,
+            max_size=self.fetcher_config.work_dir_max_size,
+            max_age=self.fetcher_config.work_dir_max_age,
+        )
+        # metadata requests are small and frequent, media downloads are large, they are paced separately
+        self.metadata_limiter = RateLimiter(
+            'youtube_metadata', self.fetcher_config.metadata_rate, self.fetcher_config.metadata_burst)
+        self.media_limiter = RateLimiter(
+            'youtube_media', self.fetcher_config.media_rate, self.fetcher_config.media_burst)
+        self.info_flight: SingleFlight[dict[str, Any]] = SingleFlight()
+        self.item_flight: SingleFlight[dict[str, Any] | None] = SingleFlight()
+        # key and info of the audio uploaded by the flight
+        self.audio_flight: SingleFlight[tuple[str, ObjectInfo]] = SingleFlight()
+        self.refs = AudioRefs(self.state_dir / 'refs.sqlite3' if self.state_dir else None)
+        # audio is downloaded in background, so that fetching does not wait for the downloading and transcoding
+        self.downloads = JobQueue(
+            'download',
+            self.fetcher_config.download_workers,
+            self.fetcher_config.download_order,
+            self._on_downloads_done,
+        )
+        self._sources: dict[str, SourceConfig] = {}
+        self._last_rescan: dict[str, float] = {}
+        # ids of the items of each source whose audio was not ready in the last scan, queued or failed,
+        # the scan goes on past the published items until they are seen again
+        self.unready_ids: dict[str, frozenset[str | None]] = {}
+
+    def start(self) -> None:
+        self._open_cache_dir()
+        self.cache.start()
+        self.refs.start()
+        self.work_dir.start()
+        self.metadata_pool.open()
+        self.downloads.start()
+        if self.fetcher_config.warm_up_url:
+            self.warm_up(str(self.fetcher_config.warm_up_url))
+
+    def _open_cache_dir(self) -> None:
+        # yt-dlp keeps the solved player signatures in its cache dir, losing them slows down the first requests
+        if self.cache_dir is None:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.warning(f'failed to create the cache dir of yt-dlp: {self.cache_dir} due to {e}')
+            return
+        if not os.access(self.cache_dir, os.R_OK | os.W_OK | os.X_OK):
+            logger.warning(f'the cache dir of yt-dlp is not writable: {self.cache_dir}')
+            return
+        logger.info(f'open the cache dir of yt-dlp: {self.cache_dir}')
+        self.ydl_opts['cachedir'] = str(self.cache_dir)
+
+    def warm_up(self, url: str) -> None:
+        """
+        Extract a video to prime the caches of yt-dlp and the pooled instances, before fetching sources.
+        """
+        logger.info(f'warm up: {url}')
+
+        def extract() -> None:
+            with self.metadata_pool.acquire() as ydl:
+                ydl.extract_info(url, download=False)
+
+        try:
+            self.call_limited(self.metadata_limiter, extract)
+        except yt_dlp.DownloadError as e:
+            logger.warning(f'failed to warm up due to {e}')
+
+    def stop(self) -> None:
+        self.downloads.stop()
+        with self._download_pools_lock:
+            download_pools, self.download_pools = self.download_pools, {}
+        for pool in download_pools.values():
+            pool.close()
+        self.metadata_pool.close()
+        self.refs.stop()
+        self.cache.stop()
+
+    def join(self) -> None:
+        self.downloads.join()
+
+    def get_download_pool(self, profile: AudioProfile) -> Pool[Any]:
+        with self._download_pools_lock:
+            if profile not in self.download_pools:
+                opts = profile.ydl_opts
+                opts.update(self.ydl_opts)
+                pool: Pool[Any] = Pool(
+                    lambda: yt_dlp.YoutubeDL(dict(opts)), _close_ydl, max_size=self.fetcher_config.download_workers)
+                pool.open()
+                self.download_pools[profile] = pool
+            return self.download_pools[profile]
+
+    def _on_downloads_done(self, source_id: str, succeeded: int) -> None:
+        if succeeded == 0:
+            return
+        logger.info(f'[{source_id}] {succeeded} audio downloaded')
+        self.on_ready(self._sources[source_id])
+
+    def shared_keys(self, source: SourceConfig) -> set[str]:
+        return self.refs.keys(source.id)
+
+    def release(self, source: SourceConfig, key: str) -> bool:
+        return self.refs.remove(key, source.id) == 0
+
+    def notify_shared_audio(self, key: str, source_id: str) -> None:
+        # the audio is downloaded by the job of one source, the other sources which reference it are notified here
+        for ref in self.refs.sources(key) - {source_id}:
+            if ref in self._sources:
+                self.on_ready(self._sources[ref])
+
+    def call_limited(self, limiter: RateLimiter, func: Callable[[], T]) -> T:
+        """
+        Call the function within the budget of the limiter, it is retried after backing off if the upstream throttles.
+        """
+        for _ in range(_throttled_retries):
+            try:
+                with limiter.limit(_is_throttled):
+                    return func()
+            except yt_dlp.DownloadError as e:
+                if not _is_throttled(e):
+                    raise
+                logger.warning(f'[{limiter.name}] retry after throttled: {e}')
+        with limiter.limit(_is_throttled):
+            return func()
+
+    def _extract_info(self, url: str) -> dict[str, Any]:
+        # the entries of a playlist are extracted lazily by the instance, which is not thread-safe,
+        # so a dedicated instance is used until the entries are exhausted instead of a pooled one
+        ydl = yt_dlp.YoutubeDL(dict(self.ydl_opts))
+
+        def extract() -> dict[str, Any]:
+            result: dict[str, Any] = ydl.extract_info(url, download=False, process=False)
+            return result
+
+        try:
+            info = self.call_limited(self.metadata_limiter, extract)
+        except BaseException:
+            _close_ydl(ydl)
+            raise
+        entries = info.get('entries', None)
+        if isgenerator(entries):
+            # entries are fetched page by page, the pages are shared by the callers of the same flight
+            info['entries'] = SharedIterable(_close_after(ydl, entries))
+        else:
+            _close_ydl(ydl)
+        return info
 
     def fetch_info(self, url: str) -> dict[str, Any]:
-        with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-            info = ydl.extract_info(str(url), download=False, process=False)  # type: dict[str, Any]
-            return info
+        # sources of the same channel are often fetched at the same time, they wait for one extraction
+        info = self.info_flight.do(str(url), lambda: self._extract_info(str(url)))
+        if isinstance(info.get('entries', None), SharedIterable):
+            info = {**info, 'entries': iter(info['entries'])}
+        return info
+
+    def _is_rescan_due(self, source: SourceConfig) -> bool:
+        interval = self.fetcher_config.rescan_interval
+        if interval == 0:
+            return False
+        now = monotonic()
+        last_rescan = self._last_rescan.setdefault(source.id, now)
+        if now - last_rescan < interval:
+            return False
+        self._last_rescan[source.id] = now
+        return True
 
-    def fetch(self, source: SourceConfig) -> Podcast:
+    def fetch(self, source: SourceConfig, known_ids: AbstractSet[str] = frozenset()) -> Podcast:
+        self._sources[source.id] = source
+        if known_ids and self._is_rescan_due(source):
+            logger.info(f'[{source.id}] full rescan')
+            known_ids = frozenset()
         info = self.fetch_info(str(source.url))
         if isgenerator(info.get('entries', None)):
-            return self.fetch_entries(info, source)
+            return self.fetch_entries(info, source, known_ids)
         raise ValueError(f'unsupported url: {source.url}')
 
-    def fetch_entries(self, info: dict[str, Any], source: SourceConfig) -> Podcast:
+    def fetch_entries(
+            self, info: dict[str, Any], source: SourceConfig, known_ids: AbstractSet[str] = frozenset()) -> Podcast:
         logger.info(f'[{source.id}] parse entries: {source.url}')
         if self.owner_config:
             owner = Owner(name=self.owner_config.name, email=self.owner_config.email)
         else:
             owner = None
         podcast = Podcast(
-            items=Entry(info.get('entries', []), self.ydl_opts, self.storage, source),
+            items=Entry(info.get('entries', []), self, source, known_ids),
             link=urlparse(info['webpage_url']),
             title=source.name or info['title'],
             image=EntryThumbnail(info['thumbnails']),
@@ -70,41 +304,156 @@ class YouTube(Fetcher):
 
 class Entry(Resource[Iterable[Episode]]):
     def __init__(
-            self, entries: Iterable[dict[str, Any]], ydl_opts: dict[str, Any], storage: Storage, source: SourceConfig):
+            self,
+            entries: Iterable[dict[str, Any]],
+            youtube: YouTube,
+            source: SourceConfig,
+            known_ids: AbstractSet[str] = frozenset(),
+    ):
         self.entries = entries
-        self.ydl_opts = ydl_opts
-        self.storage = storage
+        self.youtube = youtube
+        self.cache = youtube.cache
         self.source = source
+        self.known_ids = known_ids
+        self.is_newest_first = _is_newest_first(str(source.url))
+        self.concurrency = source.concurrency or youtube.fetcher_config.concurrency
+        self.since = datetime.combine(source.since, time.min, tzinfo=timezone.utc) if source.since else None
+
+    def _is_before_since(self, pub_date: datetime | None) -> bool:
+        return self.since is not None and pub_date is not None and pub_date < self.since
+
+    def _iter_entries(self) -> Iterator[dict[str, Any]]:
+        unready_ids = set(self.youtube.unready_ids.get(self.source.id, ()))
+        for entry in self.entries:
+            exit_signal.check()
+            unready_ids.discard(entry.get('id'))
+            if entry.get('id') in self.known_ids:
+                if self.is_newest_first and not unready_ids:
+                    logger.info(f'[{self.source.id}] stop at published item {entry["id"]}')
+                    break
+                logger.debug(f'[{self.source.id}] skip published item {entry["id"]}')
+                continue
+            # flat entries of most extractors have a title, use it to filter before extracting the full metadata
+            title = entry.get('title')
+            if self.source.regex and title and not self.source.regex.search(title):
+                logger.info(f'[{self.source.id}] skip item {entry.get("id", entry["url"])} due to regex')
+                continue
+            yield entry
+
+    def _extract_item(self, entry: dict[str, Any]) -> dict[str, Any] | None:
+        return self.youtube.item_flight.do(entry['url'], lambda: self._load_item(entry))
+
+    def _load_item(self, entry: dict[str, Any]) -> dict[str, Any] | None:
+        video_info = self.cache.get(entry['id']) if 'id' in entry else None
+        if video_info is not None:
+            logger.debug(f'[{self.source.id}] metadata cache hit: {entry["id"]}')
+            return video_info
+
+        def extract() -> dict[str, Any]:
+            with self.youtube.metadata_pool.acquire() as ydl:
+                result: dict[str, Any] = ydl.extract_info(entry['url'], download=False)
+                return result
+
+        try:
+            extracted_info = self.youtube.call_limited(self.youtube.metadata_limiter, extract)
+        except yt_dlp.DownloadError as e:
+            logger.error(f'[{self.source.id}] failed to fetch item({entry["url"]}) due to {e}')
+            return None
+        video_info = {k: extracted_info[k] for k in _metadata_keys}
+        self.cache.put(video_info['id'], video_info, _parse_upload_date(video_info))
+        return video_info
+
+    def _fetch_item(self, entry: dict[str, Any]) -> Episode | None:
+        exit_signal.check()
+        video_info = self._extract_item(entry)
+        if video_info is None:
+            return None
+        if self.source.regex and not self.source.regex.search(video_info['title']):
+            logger.info(f'[{self.source.id}] skip item {video_info["id"]} due to regex')
+            return None
+        upload_at = _parse_upload_date(video_info)
+        logger.info(f'[{self.source.id}] fetch item: {video_info["id"]}')
+        audio = Audio(video_info, self.youtube, self.source)
+        if not self._is_before_since(upload_at):
+            # check the audio in the worker, it is queued for downloading if not exists
+            audio.get()
+        return Episode(
+            enclosure=audio,
+            title=video_info['title'],
+            description=video_info['description'],
+            guid=video_info['id'],
+            duration=timedelta(seconds=video_info['duration']),
+            pub_date=upload_at,
+            link=urlparse(video_info['webpage_url']),
+            image=PlainResource(urlparse(video_info['thumbnail'])),
+        )
 
-    def get(self) -> Iterable[Episode] | None:
-        logger.debug(f'[{self.source.id}] fetch items')
-        with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-            is_empty = True
-            for entry in self.entries:
-                exit_signal.check()
-                is_empty = False
-                try:
-                    video_info = ydl.extract_info(entry['url'], download=False)
-                except yt_dlp.DownloadError as e:
-                    logger.error(f'[{self.source.id}] failed to fetch item({entry["url"]}) due to {e}')
-                    continue
-                if self.source.regex and not self.source.regex.search(video_info['title']):
-                    logger.info(f'[{self.source.id}] skip item {video_info["id"]} due to regex')
-                    continue
-                upload_at = datetime.strptime(video_info['upload_date'], '%Y%m%d').replace(tzinfo=timezone.utc)
-                logger.info(f'[{self.source.id}] fetch item: {video_info["id"]}')
-                yield Episode(
-                    enclosure=Audio(video_info, self.ydl_opts, self.storage, self.source),
-                    title=video_info['title'],
-                    description=video_info['description'],
-                    guid=video_info['id'],
-                    duration=timedelta(seconds=video_info['duration']),
-                    pub_date=upload_at,
-                    link=urlparse(video_info['webpage_url']),
-                    image=PlainResource(urlparse(video_info['thumbnail'])),
-                )
-            if is_empty:
-                return None
+    def _capacity(self, accepted: int) -> int:
+        """
+        :param accepted: number of fetched items in the window
+        :return: maximum number of items in flight, their audio is queued for downloading by the workers,
+                 so there are no more of them than the rest of `max_episodes`
+        """
+        if self.source.max_episodes:
+            return min(self.concurrency, self.source.max_episodes - accepted)
+        return self.concurrency
+
+    def _fetch_items(self) -> Generator[Episode, None, None]:
+        # items are fetched in parallel, but yielded in the order of the playlist
+        pending: deque[Future[Episode | None]] = deque()
+        accepted = 0
+        entries = self._iter_entries()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f'entry_{self.source.id}') as executor:
+            try:
+                while True:
+                    if len(pending) < self._capacity(accepted):
+                        entry = next(entries, None)
+                        if entry is not None:
+                            pending.append(executor.submit(self._fetch_item, entry))
+                            continue
+                    if not pending:
+                        break
+                    episode = pending.popleft().result()
+                    if episode is None:
+                        continue
+                    if not self._is_before_since(episode.pub_date):
+                        accepted += 1
+                    yield episode
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def get(self) -> Iterator[Episode]:
+        logger.debug(f'[{self.source.id}] fetch items (concurrency: {self.concurrency})')
+        cnt = 0
+        ready_ids: set[str | None] = set()
+        unready_ids: set[str | None] = set()
+        try:
+            with closing(self._fetch_items()) as episodes:
+                for episode in episodes:
+                    if self._is_before_since(episode.pub_date):
+                        if self.is_newest_first:
+                            logger.info(f'[{self.source.id}] stop at item {episode.guid} published before {self.since}')
+                            break
+                        logger.info(f'[{self.source.id}] skip item {episode.guid} published before {self.since}')
+                        continue
+                    cnt += 1
+                    if episode.enclosure.get() is None:
+                        logger.info(f'[{self.source.id}] skip item {episode.guid} until its audio is downloaded')
+                        unready_ids.add(episode.guid)
+                    else:
+                        ready_ids.add(episode.guid)
+                        yield episode
+                    if self.source.max_episodes and cnt >= self.source.max_episodes:
+                        logger.info(f'[{self.source.id}] stop after {cnt} items')
+                        break
+        except BaseException:
+            # the scan is interrupted, the unready items which have not been seen are kept
+            previous = self.youtube.unready_ids.get(self.source.id, frozenset())
+            self.youtube.unready_ids[self.source.id] = (previous - ready_ids) | unready_ids
+            raise
+        # the unready items out of the window or removed from the playlist are not waited for any more
+        self.youtube.unready_ids[self.source.id] = frozenset(unready_ids)
 
 
 class EntryThumbnail(Resource[ParseResult]):
@@ -120,43 +469,90 @@ class EntryThumbnail(Resource[ParseResult]):
 
 
 class Audio(Resource[Enclosure]):
-    def __init__(self, info: dict[str, Any], ydl_opts: dict[str, Any], storage: Storage, source: SourceConfig):
+    def __init__(self, info: dict[str, Any], youtube: YouTube, source: SourceConfig):
         self.info = info
-        self.ydl_opts: dict[str, Any] = {
-            'format': 'ba',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-            }],
-        }
-        self.ydl_opts.update(ydl_opts)
-        self.storage = storage
+        self.youtube = youtube
+        self.storage = youtube.storage
         self.source = source
+        self.profile = AudioProfile(
+            source.audio_format or youtube.fetcher_config.audio_format,
+            source.bitrate or youtube.fetcher_config.bitrate,
+        )
+        self._enclosure: Enclosure | None = None
+        self._is_checked = False
+
+    def upload(self, key: str) -> ObjectInfo:
+        # the sources with the same video and profile share one download and conversion,
+        # the audio uploaded by the flight is copied to the keys of the others
+        uploaded_key, info = self.youtube.audio_flight.do(
+            (self.info['id'], self.profile), lambda: (key, self._upload(key)))
+        if uploaded_key == key:
+            return info
+        logger.info(f'[{self.source.id}] copy audio: {uploaded_key} -> {key}')
+        with self.storage.get(uploaded_key) as f:
+            return self.storage.put_stream(f, key=key, content_type=self.profile.mime_type)
 
-    def upload(self, key: str) -> tuple[ParseResult, int]:
+    def _upload(self, key: str) -> ObjectInfo:
         logger.debug(f'[{self.source.id}] upload audio: {key}')
-        with TemporaryDirectory(prefix='podmaker_youtube_') as cache_dir:
-            opts = {'paths': {'home': cache_dir}}
-            opts.update(self.ydl_opts)
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                logger.info(f'[{self.source.id}] fetch audio: {self.info["id"]}')
-                downloaded_info = ydl.extract_info(self.info['webpage_url'])
-                audio_path = downloaded_info['requested_downloads'][0]['filepath']
-                length = os.path.getsize(audio_path)
-            with open(audio_path, 'rb') as f:
+        work_dir = self.youtube.work_dir
+        with work_dir.acquire(f'{self.info["id"]}.{self.profile.suffix}') as download_dir:
+
+            def download_audio() -> dict[str, Any]:
+                with self.youtube.get_download_pool(self.profile).acquire() as ydl:
+                    # partial files in the download dir are resumed by yt-dlp,
+                    # the params are not shared by the pooled instances
+                    ydl.params['paths'] = {'home': str(download_dir)}
+                    logger.info(f'[{self.source.id}] fetch audio: {self.info["id"]}')
+                    result: dict[str, Any] = ydl.extract_info(self.info['webpage_url'])
+                    return result
+
+            downloaded_info = self.youtube.call_limited(self.youtube.media_limiter, download_audio)
+            download = downloaded_info['requested_downloads'][0]
+            # the transcoded audio is streamed into the storage without being written to the disk,
+            # unless the work dir is persistent, then it is kept for the next attempt in case the upload fails
+            with self.profile.convert(
+                    Path(download['filepath']), download.get('acodec'), keep=work_dir.path is not None) as f:
                 logger.info(f'[{self.source.id}] upload audio: {key}')
-                url = self.storage.put(f, key=key, content_type='audio/mp3')
-        return url, length
+                info = self.storage.put_stream(f, key=key, content_type=self.profile.mime_type)
+        return info
 
-    @lru_cache(maxsize=1)
-    def get(self) -> Enclosure | None:
+    def _get_key(self) -> str:
+        if self.youtube.fetcher_config.shared_audio:
+            return f'{_shared_prefix}/youtube/{self.info["id"]}.{self.profile.suffix}'
+        return self.source.get_storage_key(f'youtube/{self.info["id"]}.{self.profile.ext}')
+
+    def _check(self) -> Enclosure | None:
         logger.debug(f'[{self.source.id}] fetch audio: {self.info["id"]}')
-        key = self.source.get_storage_key(f'youtube/{self.info["id"]}.mp3')
+        key = self._get_key()
+        if self.youtube.fetcher_config.shared_audio:
+            self.youtube.refs.add(key, self.source.id)
         info = self.storage.check(key)
         if info:
             logger.info(f'[{self.source.id}] audio already exists: {key}')
-            url = info.uri
-            length = info.size
-        else:
-            url, length = self.upload(key)
-        return Enclosure(url=url, length=length, type='audio/mp3')
+            return Enclosure(url=info.uri, length=info.size, type=self.profile.mime_type)
+        is_queued = self.youtube.downloads.submit(
+            key,
+            lambda: self._download(key),
+            group=self.source.id,
+            limit=self.source.download_concurrency,
+            priority=self.source.priority,
+        )
+        if is_queued:
+            logger.info(f'[{self.source.id}] audio queued: {key}')
+        return None
+
+    def _download(self, key: str) -> None:
+        # the audio may be uploaded by an earlier job between checking and queueing
+        if self.storage.check(key) is None:
+            self.upload(key)
+            if self.youtube.fetcher_config.shared_audio:
+                self.youtube.notify_shared_audio(key, self.source.id)
+
+    def get(self) -> Enclosure | None:
+        """
+        :return: the enclosure of the audio, `None` if the audio is not ready and has been queued for downloading
+        """
+        if not self._is_checked:
+            self._enclosure = self._check()
+            self._is_checked = True
+        return self._enclosure
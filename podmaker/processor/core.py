@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 import logging
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait
 from contextlib import contextmanager
 from typing import Any, Iterator
 
 from podmaker.config import PMConfig, SourceConfig
 from podmaker.fetcher import Fetcher
+from podmaker.processor.gc import GarbageCollector
 from podmaker.processor.task import Task
 from podmaker.storage import Storage
 from podmaker.util import exit_signal
@@ -20,9 +21,14 @@ class Processor:
         self._storage = storage
         exit_signal.register(self._exit_handler)
         self._fetcher_instances: dict[str, Fetcher] = {}
+        self._task_instances: dict[str, Task] = {}
+        self._executor: ThreadPoolExecutor | None = None
+        self._gc = GarbageCollector(storage, config.gc) if config.gc.enabled else None
 
     @contextmanager
     def _context(self) -> Iterator[None]:
+        for source in self._config.sources:
+            self._get_fetcher(source)
         for fetcher in self._fetcher_instances.values():
             fetcher.start()
         try:
@@ -35,7 +41,9 @@ class Processor:
         if source.url.host not in self._fetcher_instances:
             if source.url.host == 'www.youtube.com':
                 from podmaker.fetcher.youtube import YouTube
-                self._fetcher_instances[source.url.host] = YouTube(self._storage, self._config.owner)
+                fetcher = YouTube(self._storage, self._config.owner, self._config.fetcher, self._config.app.state_dir)
+                fetcher.on_ready = self._on_ready
+                self._fetcher_instances[source.url.host] = fetcher
             else:
                 raise ValueError(f'unsupported host: {source.url.host}')
         return self._fetcher_instances[source.url.host]
@@ -44,7 +52,26 @@ class Processor:
     def _tasks(self) -> Iterator[Task]:
         for source in self._config.sources:
             fetcher = self._get_fetcher(source)
-            yield Task(fetcher, source, self._storage, self._config.owner)
+            task = Task(fetcher, source, self._storage, self._config.owner, self._gc)
+            self._task_instances[source.id] = task
+            yield task
+
+    def _on_ready(self, source: SourceConfig) -> None:
+        task = self._task_instances.get(source.id)
+        if task is None:
+            logger.warning(f'task of {source.id} not found, maybe it was removed')
+            return
+        logger.info(f'refresh task: {task.id}')
+        self.refresh(task)
+
+    def refresh(self, task: Task) -> None:
+        if self._executor is None:
+            logger.warning(f'task({task.id}) will be refreshed in the next run')
+            return
+        try:
+            self._executor.submit(task.execute)
+        except RuntimeError:
+            logger.warning(f'task({task.id}) will be refreshed in the next run')
 
     def _exit_handler(self, *_: Any) -> None:
         logger.warning('received exit signal')
@@ -56,7 +83,14 @@ class Processor:
     def run(self) -> None:
         with self._context():
             with ThreadPoolExecutor(max_workers=5) as executor:
+                self._executor = executor
+                futures = []
                 for task in self._tasks:
                     logger.info(f'submit task: {task.id}')
-                    executor.submit(task.execute)
+                    futures.append(executor.submit(task.execute))
+                wait(futures)
+                # wait for the audio downloaded in background, the tasks are refreshed after that
+                for fetcher in self._fetcher_instances.values():
+                    fetcher.join()
+            self._executor = None
             logger.info('processor exited')
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+__all__ = ['GarbageCollector', 'GCStats']
+
+import dataclasses
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import get_args
+
+from podmaker.config import AudioFormat, GCConfig, SourceConfig
+from podmaker.fetcher import Fetcher
+from podmaker.rss import Podcast
+from podmaker.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GCStats:
+    # audio objects of the source, including the shared ones
+    scanned: int = 0
+    # objects referenced by the feed
+    referenced: int = 0
+    # orphaned objects kept in the grace period
+    recent: int = 0
+    # shared objects released by the source but still referenced by other sources,
+    # or to be released in the dry-run mode
+    shared: int = 0
+    # orphaned objects out of the grace period, they are deleted unless in the dry-run mode
+    orphaned: int = 0
+    orphaned_bytes: int = 0
+    deleted: int = 0
+
+    def merge(self, other: GCStats) -> None:
+        for field in dataclasses.fields(self):
+            setattr(self, field.name, getattr(self, field.name) + getattr(other, field.name))
+
+
+def _referenced_keys(podcast: Podcast) -> set[str]:
+    """
+    :return: every suffix of the paths of the enclosures, the keys are matched without knowing the public endpoint
+    """
+    keys: set[str] = set()
+    for episode in podcast.items.ensure():
+        parts = episode.enclosure.ensure().url.path.split('/')
+        keys.update('/'.join(parts[i:]) for i in range(1, len(parts)))
+    return keys
+
+
+# the extensions of the audio written by the fetchers, the MIME types guessed by the host may miss some of them
+_audio_exts = tuple(f'.{ext}' for ext in get_args(AudioFormat))
+
+
+def _is_audio(key: str) -> bool:
+    parent, _, name = key.rpartition('/')
+    return parent.endswith('/youtube') and name.endswith(_audio_exts)
+
+
+class GarbageCollector:
+    """
+    Delete the audio of sources which is not referenced by their feeds any more.
+
+    The audio under the prefix of a source and the shared audio referenced by it are compared with the enclosures of
+    its feed, the orphans are deleted in batches once they are older than the grace period.
+    """
+
+    def __init__(self, storage: Storage, config: GCConfig):
+        self.storage = storage
+        self.interval = config.interval
+        self.grace_period = timedelta(seconds=config.grace_period)
+        self.dry_run = config.dry_run
+        self.stats = GCStats()
+        self._last_runs: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _is_due(self, source: SourceConfig) -> bool:
+        now = monotonic()
+        with self._lock:
+            last_run = self._last_runs.get(source.id)
+            if last_run is not None and now - last_run < self.interval:
+                return False
+            self._last_runs[source.id] = now
+        return True
+
+    def _list_shared(self, keys: set[str]) -> dict[str, tuple[int, datetime]]:
+        prefixes = {key[:key.rfind('/') + 1] for key in keys}
+        objects = {}
+        for prefix in prefixes:
+            for key, size, modified in self.storage.list_objects(prefix):
+                if key in keys:
+                    objects[key] = (size, modified)
+        return objects
+
+    @staticmethod
+    def _is_orphan(stats: GCStats, referenced: set[str], deadline: datetime, key: str, modified: datetime) -> bool:
+        """
+        :return: whether the object is an orphan out of the grace period
+        """
+        stats.scanned += 1
+        if key in referenced:
+            stats.referenced += 1
+            return False
+        if modified > deadline:
+            stats.recent += 1
+            return False
+        return True
+
+    def _release_shared(
+            self, source: SourceConfig, fetcher: Fetcher, stats: GCStats, referenced: set[str], deadline: datetime
+    ) -> list[tuple[str, int]]:
+        """
+        :return: key and size of the shared orphans which are not referenced by any source
+        """
+        orphans = []
+        for key, (size, modified) in self._list_shared(fetcher.shared_keys(source)).items():
+            if not self._is_orphan(stats, referenced, deadline, key, modified):
+                continue
+            if self.dry_run:
+                logger.info(f'[{source.id}] would release shared audio: {key}')
+                stats.shared += 1
+            # the reference is dropped even if the object is kept for other sources
+            elif fetcher.release(source, key):
+                orphans.append((key, size))
+            else:
+                stats.shared += 1
+        return orphans
+
+    def collect(self, source: SourceConfig, podcast: Podcast, fetcher: Fetcher) -> GCStats | None:
+        """
+        :param podcast: the current feed of the source
+        :return: the stats of the collection, `None` if it is not due
+        """
+        if not self._is_due(source):
+            return None
+        logger.info(f'[{source.id}] collect garbage{" (dry run)" if self.dry_run else ""}')
+        stats = GCStats()
+        referenced = _referenced_keys(podcast)
+        deadline = datetime.now(timezone.utc) - self.grace_period
+        orphans = [
+            (key, size) for key, size, modified in self.storage.list_objects(source.get_storage_key(''))
+            if _is_audio(key) and self._is_orphan(stats, referenced, deadline, key, modified)
+        ]
+        orphans.extend(self._release_shared(source, fetcher, stats, referenced, deadline))
+        for key, size in orphans:
+            logger.info(f'[{source.id}] {"would delete" if self.dry_run else "delete"} orphaned audio: {key}')
+            stats.orphaned += 1
+            stats.orphaned_bytes += size
+        if orphans and not self.dry_run:
+            stats.deleted = self.storage.delete(key for key, _ in orphans)
+        with self._lock:
+            self.stats.merge(stats)
+        logger.info(f'[{source.id}] garbage collected: {stats}')
+        return stats
@@ -8,6 +8,7 @@ from apscheduler.triggers.interval import IntervalTrigger
 
 from podmaker.config import PMConfig
 from podmaker.processor.core import Processor
+from podmaker.processor.task import Task
 from podmaker.storage import Storage
 
 logger = logging.getLogger(__name__)
@@ -21,6 +22,10 @@ class ScheduleProcessor(Processor):
     def exit_handler(self, *_: Any) -> None:
         self._scheduler.shutdown(wait=False)
 
+    def refresh(self, task: Task) -> None:
+        # run once immediately, the task serializes its executions
+        self._scheduler.add_job(func=task.execute, name=f'Job-{task.id}-refresh')
+
     def _before_hook(self, task_id: str) -> None:
         try:
             self._scheduler.pause_job(task_id)
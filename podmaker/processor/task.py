@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import logging
+import threading
+from datetime import datetime, time, timezone
 from io import BytesIO
 from typing import Any, Callable
 from uuid import uuid4
 
 from podmaker.config import OwnerConfig, SourceConfig
 from podmaker.fetcher import Fetcher
+from podmaker.processor.gc import GarbageCollector
 from podmaker.rss import Podcast
+from podmaker.rss.core import PlainResource
 from podmaker.storage import EMPTY_FILE, Storage
 from podmaker.util import ExitSignalError
 
@@ -21,13 +25,24 @@ def _do_nothing(*_: Any) -> None:
 
 
 class Task:
-    def __init__(self, fetcher: Fetcher, source: SourceConfig, storage: Storage, owner: OwnerConfig | None):
+    def __init__(
+            self,
+            fetcher: Fetcher,
+            source: SourceConfig,
+            storage: Storage,
+            owner: OwnerConfig | None,
+            gc: GarbageCollector | None = None,
+    ):
         self._id = uuid4().hex
         logger.info(f'create task {self._id} for {source.id}')
         self._source = source
         self._storage = storage
         self._owner = owner
         self._fetcher = fetcher
+        self._gc = gc
+        self._lock = threading.Lock()
+        # the feed read or written last time and its ETag, it is reused if the stored feed has not changed
+        self._original: tuple[str, Podcast] | None = None
         self.before: Hook = _do_nothing
         self.after: Hook = _do_nothing
 
@@ -39,39 +54,78 @@ class Task:
     def interval(self) -> int:
         return self._source.interval
 
-    def _fetch_original(self, key: str) -> Podcast | None:
-        with self._storage.get(key) as xml_file:
+    @property
+    def _since(self) -> datetime | None:
+        if self._source.since is None:
+            return None
+        return datetime.combine(self._source.since, time.min, tzinfo=timezone.utc)
+
+    def _fetch_original(self, key: str) -> tuple[Podcast | None, str | None]:
+        """
+        :return: the stored feed and its ETag
+        """
+        original, self._original = self._original, None
+        with self._storage.get_if_changed(key, original[0] if original else None) as result:
+            if result is None and original is not None:
+                logger.info(f'original file not changed: {key}')
+                return original[1], original[0]
+            xml_file, etag = result or (EMPTY_FILE, None)
             if xml_file == EMPTY_FILE:
                 logger.info(f'no original file: {key}')
-                return None
+                return None, None
             xml = xml_file.read()
-        return Podcast.from_rss(xml.decode('utf-8'))
+        return Podcast.from_rss(xml.decode('utf-8')), etag
 
     def _execute(self) -> None:
         logger.info(f'execute task: {self.id}')
         try:
             key = self._source.get_storage_key('feed.rss')
-            original_pod = self._fetch_original(key)
-            source_pod = self._fetcher.fetch(self._source)
+            # the cached feed is taken out, it is modified by merging and cached again once it is stored
+            original_pod, etag = self._fetch_original(key)
+            if original_pod:
+                known_ids = frozenset(i.unique_id for i in original_pod.items.ensure())
+            else:
+                known_ids = frozenset()
+            source_pod = self._fetcher.fetch(self._source, known_ids)
             if original_pod:
-                has_changed = original_pod.merge(source_pod)
+                has_changed = original_pod.merge(source_pod, max_items=self._source.max_episodes, since=self._since)
             else:
+                items = list(source_pod.items.ensure())
+                if not items:
+                    logger.info(f'no episode is ready: {self._source.id}')
+                    return
                 has_changed = True
+                source_pod.items = PlainResource(items)
                 original_pod = source_pod
             if has_changed:
                 logger.info(f'update: {self._source.id}')
                 buf = BytesIO(original_pod.bytes)
-                self._storage.put(buf, key, content_type='text/xml; charset=utf-8')
+                etag = self._storage.put_stream(buf, key, content_type='text/xml; charset=utf-8').etag
             else:
                 logger.info(f'no change: {self._source.id}')
+            if etag:
+                self._original = (etag, original_pod)
+            self._collect_garbage(original_pod)
         except ExitSignalError as e:
             logger.warning(f'task ({self.id}) cancelled due to {e}')
         except BaseException as e:
             logger.error(f'task execute failed: {e} task: {self.id}')
 
+    def _collect_garbage(self, pod: Podcast) -> None:
+        if self._gc is None:
+            return
+        # the feed has been stored, a failed collection is retried after the interval of collections
+        try:
+            self._gc.collect(self._source, pod, self._fetcher)
+        except ExitSignalError:
+            raise
+        except Exception as e:
+            logger.error(f'garbage collection failed: {e} task: {self.id}')
+
     def execute(self) -> None:
         logger.debug(f'task running: {self._source.id}')
         self.before(self.id)
-        self._execute()
+        with self._lock:
+            self._execute()
         logger.debug(f'task finished: {self.id}')
         self.after(self.id)
@@ -4,6 +4,7 @@ import re
 import sys
 from collections.abc import Iterable
 from dataclasses import dataclass, field
+from datetime import datetime
 from typing import Any
 from urllib.parse import ParseResult, urlparse
 from xml.etree.ElementTree import Element
@@ -103,7 +104,11 @@ class Podcast(RSSSerializer, RSSDeserializer):
             language
         )
 
-    def merge(self, other: Self) -> bool:
+    def merge(self, other: Self, *, max_items: int | None = None, since: datetime | None = None) -> bool:
+        """
+        :param max_items: keep at most `max_items` latest items
+        :param since: drop the items published before `since`
+        """
         has_changed = self._common_merge(
             other,
             ('link', 'title', 'description', 'owner', 'author', 'explicit', 'language')
@@ -115,27 +120,32 @@ class Podcast(RSSSerializer, RSSDeserializer):
         if set(self.categories) != set(other.categories):
             self.categories = other.categories
             has_changed = True
-        if self._merge_items(other.items):
+        if self._merge_items(other.items, max_items, since):
             has_changed = True
         return has_changed
 
-    def _merge_items(self, others: Resource[Iterable[Episode]]) -> bool:
+    def _merge_items(
+            self, others: Resource[Iterable[Episode]], max_items: int | None, since: datetime | None) -> bool:
         new_items = []
         has_changed = False
-        old_ids = {i.unique_id: i for i in self.items.ensure()}
+        old_items = list(self.items.ensure())
+        old_ids = {i.unique_id: i for i in old_items}
         for item in others.ensure():
             if item.unique_id not in old_ids:
                 new_items.append(item)
             else:
                 old_item = old_ids[item.unique_id]
                 has_changed = old_item.merge(item) or has_changed
-        if not new_items and not has_changed:
-            return False
+        merged_items = old_items + new_items
+        if since is not None:
+            merged_items = [i for i in merged_items if i.pub_date is None or i.pub_date >= since]
         sorted_items = sorted(
-            list(self.items.ensure()) + new_items,
+            merged_items,
             key=lambda i: i.pub_date or 0,
             reverse=True
-        )
+        )[:max_items]
+        if not has_changed and {i.unique_id for i in sorted_items} == old_ids.keys():
+            return False
         self.items = PlainResource(sorted_items)
         return True
 
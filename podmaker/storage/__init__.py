@@ -1,15 +1,30 @@
-__all__ = ['Storage', 'ObjectInfo', 'EMPTY_FILE', 'get_storage']
+__all__ = ['Storage', 'ObjectInfo', 'EMPTY_FILE', 'CachedStorage', 'CompressedStorage', 'get_storage']
 
 from podmaker.config import LocalConfig, S3Config, StorageConfig
+from podmaker.storage.cache import CachedStorage
+from podmaker.storage.compress import CompressedStorage
 from podmaker.storage.core import EMPTY_FILE, ObjectInfo, Storage
 
 
 def get_storage(config: StorageConfig) -> Storage:
+    storage: Storage
     if isinstance(config, S3Config):
         from podmaker.storage.s3 import S3
-        return S3(config)
+        storage = S3(config)
+        if config.local_cache_dir is not None and config.local_cache_size > 0:
+            from podmaker.storage.local import Local
+            from podmaker.storage.tiered import TieredStorage
+            cache = Local(
+                LocalConfig(dest='local', base_dir=config.local_cache_dir, public_endpoint=config.public_endpoint)
+            )
+            storage = TieredStorage(storage, cache, config.local_cache_size)
     elif isinstance(config, LocalConfig):
         from podmaker.storage.local import Local
-        return Local(config)
+        storage = Local(config)
     else:
         raise ValueError(f'unknown storage destination: {config.dest}')
+    if config.precompress:
+        storage = CompressedStorage(storage, config.precompress)
+    if config.cache_size > 0:
+        storage = CachedStorage(storage, config.cache_size, config.cache_ttl, config.cache_negative_ttl)
+    return storage
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+__all__ = ['CachedStorage']
+
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from time import monotonic
+from typing import IO, AnyStr, Iterable, Iterator
+from urllib.parse import ParseResult
+
+from podmaker.storage.core import ObjectInfo, Storage
+
+logger = logging.getLogger(__name__)
+
+
+class CachedStorage(Storage):
+    """
+    A storage which caches the results of `check` of another storage, including the missing objects.
+
+    The cache is bounded by the number of keys and evicts the least recently used one,
+    the results expire after a TTL, and are updated by the writes through this storage.
+    """
+
+    def __init__(self, storage: Storage, size: int, ttl: int, negative_ttl: int):
+        """
+        :param storage: the storage to cache
+        :param size: the maximum number of cached keys
+        :param ttl: TTL of the info of existing objects in seconds
+        :param negative_ttl: TTL of missing objects in seconds
+        """
+        self.storage = storage
+        self.size = size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[str, tuple[float, ObjectInfo | None]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(key: str) -> str:
+        return key[1:] if key.startswith('/') else key
+
+    def _set(self, key: str, info: ObjectInfo | None) -> None:
+        ttl = self.ttl if info else self.negative_ttl
+        with self._lock:
+            if ttl <= 0:
+                self._cache.pop(key, None)
+                return
+            self._cache[key] = (monotonic() + ttl, info)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._cache.pop(self._normalize(key), None)
+
+    def check(self, key: str) -> ObjectInfo | None:
+        key = self._normalize(key)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > monotonic():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+        info = self.storage.check(key)
+        self._set(key, info)
+        return info
+
+    def put(
+            self, data: IO[AnyStr], key: str, *, content_type: str = '', cache_control: str = ''
+    ) -> ParseResult:
+        # the size is unknown for text, the info is checked again
+        self.invalidate(key)
+        try:
+            return self.storage.put(data, key, content_type=content_type, cache_control=cache_control)
+        finally:
+            self.invalidate(key)
+
+    def put_stream(
+            self, data: IO[bytes], key: str, *, content_type: str = '', content_encoding: str = '',
+            cache_control: str = ''
+    ) -> ObjectInfo:
+        self.invalidate(key)
+        info = self.storage.put_stream(
+            data, key, content_type=content_type, content_encoding=content_encoding, cache_control=cache_control)
+        self._set(self._normalize(key), info)
+        return info
+
+    def list_objects(self, prefix: str) -> Iterator[tuple[str, int, datetime]]:
+        return self.storage.list_objects(prefix)
+
+    def delete(self, keys: Iterable[str]) -> int:
+        keys = [self._normalize(key) for key in keys]
+        try:
+            return self.storage.delete(keys)
+        finally:
+            for key in keys:
+                self.invalidate(key)
+
+    @contextmanager
+    def get(self, key: str) -> Iterator[IO[bytes]]:
+        with self.storage.get(key) as f:
+            yield f
+
+    @contextmanager
+    def get_if_changed(self, key: str, etag: str | None) -> Iterator[tuple[IO[bytes], str | None] | None]:
+        with self.storage.get_if_changed(key, etag) as result:
+            yield result
+
+    def start(self) -> None:
+        self.storage.start()
+
+    def stop(self) -> None:
+        self.storage.stop()
+        logger.info(f'storage cache hits: {self.hits}, misses: {self.misses}')
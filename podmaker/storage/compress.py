@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+__all__ = ['CompressedStorage']
+
+import gzip
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from io import BytesIO
+from typing import IO, AnyStr, Callable, Iterable, Iterator
+from urllib.parse import ParseResult
+
+from podmaker.storage.core import ObjectInfo, Storage
+
+logger = logging.getLogger(__name__)
+
+
+def _gzip(data: bytes) -> bytes:
+    # without the time in the header, the same content is always compressed to the same bytes
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+# encoding: suffix of the variant and the compressor
+_compressors: dict[str, tuple[str, Callable[[bytes], bytes]]] = {'gzip': ('.gz', _gzip)}
+
+try:
+    import brotli
+
+    def _brotli(data: bytes) -> bytes:
+        # the highest qualities are much slower for a little gain
+        result: bytes = brotli.compress(data, mode=brotli.MODE_TEXT, quality=9)
+        return result
+
+    _compressors['br'] = ('.br', _brotli)
+except ImportError:
+    pass
+
+
+def _is_compressible(content_type: str) -> bool:
+    mime_type = content_type.split(';', 1)[0].strip()
+    return mime_type.startswith('text/') or mime_type.endswith(('xml', 'json'))
+
+
+class CompressedStorage(Storage):
+    """
+    A storage which publishes compressed variants of text objects, such as the feeds, besides them.
+
+    The variant of `feed.rss` compressed by gzip is `feed.rss.gz`, with the same type and the encoding of gzip.
+    The variants are compressed once when the object is written, instead of on each request by the web server.
+    They are written before the object, so that a failed write is retried as a whole.
+    """
+
+    def __init__(self, storage: Storage, encodings: Iterable[str]):
+        """
+        :param storage: the storage to write the objects and the variants
+        :param encodings: the encodings of the variants, "gzip" or "br", brotli requires the `brotli` package
+        """
+        self.storage = storage
+        self.encodings: list[str] = []
+        for encoding in encodings:
+            if encoding not in _compressors:
+                logger.warning(f'compression is not available, skip: {encoding}')
+                continue
+            self.encodings.append(encoding)
+
+    def _put_variants(self, content: bytes, key: str, content_type: str, cache_control: str) -> None:
+        for encoding in self.encodings:
+            suffix, compress = _compressors[encoding]
+            compressed = compress(content)
+            logger.debug(f'compressed {key} by {encoding}: {len(content)} -> {len(compressed)} bytes')
+            self.storage.put_stream(
+                BytesIO(compressed), key + suffix,
+                content_type=content_type, content_encoding=encoding, cache_control=cache_control)
+
+    def put(
+            self, data: IO[AnyStr], key: str, *, content_type: str = '', cache_control: str = ''
+    ) -> ParseResult:
+        if self.encodings and _is_compressible(content_type):
+            content = data.read()
+            data.seek(0)
+            content_bytes = content.encode('utf-8') if isinstance(content, str) else content
+            self._put_variants(content_bytes, key, content_type, cache_control)
+        return self.storage.put(data, key, content_type=content_type, cache_control=cache_control)
+
+    def put_stream(
+            self, data: IO[bytes], key: str, *, content_type: str = '', content_encoding: str = '',
+            cache_control: str = ''
+    ) -> ObjectInfo:
+        if not self.encodings or content_encoding or not _is_compressible(content_type):
+            return self.storage.put_stream(
+                data, key, content_type=content_type, content_encoding=content_encoding, cache_control=cache_control)
+        content = data.read()
+        self._put_variants(content, key, content_type, cache_control)
+        return self.storage.put_stream(BytesIO(content), key, content_type=content_type, cache_control=cache_control)
+
+    def check(self, key: str) -> ObjectInfo | None:
+        return self.storage.check(key)
+
+    def list_objects(self, prefix: str) -> Iterator[tuple[str, int, datetime]]:
+        return self.storage.list_objects(prefix)
+
+    def delete(self, keys: Iterable[str]) -> int:
+        return self.storage.delete(keys)
+
+    @contextmanager
+    def get(self, key: str) -> Iterator[IO[bytes]]:
+        with self.storage.get(key) as f:
+            yield f
+
+    @contextmanager
+    def get_if_changed(self, key: str, etag: str | None) -> Iterator[tuple[IO[bytes], str | None] | None]:
+        with self.storage.get_if_changed(key, etag) as result:
+            yield result
+
+    def start(self) -> None:
+        self.storage.start()
+
+    def stop(self) -> None:
+        self.storage.stop()
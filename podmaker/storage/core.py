@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import shutil
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
 from dataclasses import dataclass
+from datetime import datetime
 from io import BytesIO
-from typing import IO, AnyStr, Iterator
+from tempfile import TemporaryFile
+from typing import IO, AnyStr, Iterable, Iterator, Optional
 from urllib.parse import ParseResult
 
 
@@ -16,6 +19,8 @@ class ObjectInfo:
     size: int
     # The standard MIME type of the object.
     type: str
+    # The version of the object, it changes whenever the content changes, `None` if unknown.
+    etag: Optional[str] = None
 
 
 EMPTY_FILE = BytesIO(b'')
@@ -23,8 +28,11 @@ EMPTY_FILE = BytesIO(b'')
 
 class Storage(ABC):
     @abstractmethod
-    def put(self, data: IO[AnyStr], key: str, *, content_type: str = '') -> ParseResult:
+    def put(
+            self, data: IO[AnyStr], key: str, *, content_type: str = '', cache_control: str = ''
+    ) -> ParseResult:
         """
+        :param cache_control: the `Cache-Control` of the object, the policy configured for the key is used if empty
         :return: data uri
         """
         raise NotImplementedError
@@ -33,6 +41,25 @@ class Storage(ABC):
     def check(self, key: str) -> ObjectInfo | None:
         raise NotImplementedError
 
+    def put_stream(
+            self, data: IO[bytes], key: str, *, content_type: str = '', content_encoding: str = '',
+            cache_control: str = ''
+    ) -> ObjectInfo:
+        """
+        Upload a stream which may be not seekable, such as the output of a subprocess.
+        Backends that can not accept streams fall back to spooling the stream to a temporary file.
+
+        :param content_encoding: the encoding of the data, such as "gzip", it is served as the `Content-Encoding`
+            of the object by the backends which keep the metadata of objects
+        :param cache_control: the `Cache-Control` of the object, the policy configured for the key is used if empty
+        """
+        with TemporaryFile() as f:
+            shutil.copyfileobj(data, f)
+            size = f.tell()
+            f.seek(0)
+            uri = self.put(f, key, content_type=content_type, cache_control=cache_control)
+        return ObjectInfo(uri=uri, size=size, type=content_type)
+
     @abstractmethod
     @contextmanager
     def get(self, key: str) -> Iterator[IO[bytes]]:
@@ -41,6 +68,33 @@ class Storage(ABC):
         """
         raise NotImplementedError
 
+    @contextmanager
+    def get_if_changed(self, key: str, etag: str | None) -> Iterator[tuple[IO[bytes], str | None] | None]:
+        """
+        Get the object only if it has changed since the version of the ETag.
+
+        :param etag: the ETag of the version read or written last time, `None` to get the object anyway
+        :return: `None` if not changed, otherwise the file-like object (`EMPTY_FILE` if not found) and its ETag
+        """
+        with self.get(key) as f:
+            yield f, None
+
+    @abstractmethod
+    def list_objects(self, prefix: str) -> Iterator[tuple[str, int, datetime]]:
+        """
+        :return: key, size and last modified time of the objects whose keys start with the prefix
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, keys: Iterable[str]) -> int:
+        """
+        Delete the objects in batches, the missing objects are ignored.
+
+        :return: the number of deleted objects
+        """
+        raise NotImplementedError
+
     def start(self) -> None:
         pass
 
@@ -3,29 +3,90 @@ from __future__ import annotations
 __all__ = ['Local']
 
 import logging
+import os
 import sqlite3
-import threading
+import stat
+import tempfile
 from contextlib import contextmanager
+from datetime import datetime, timezone
+from io import TextIOBase
 from pathlib import Path
-from typing import IO, AnyStr, Iterator
+from typing import IO, AnyStr, Iterable, Iterator
 from urllib.parse import ParseResult, urljoin, urlparse
 
 from podmaker.config import LocalConfig
 from podmaker.storage import ObjectInfo, Storage
 from podmaker.storage.core import EMPTY_FILE
+from podmaker.util import Pool
 
 logger = logging.getLogger(__name__)
-lock = threading.Lock()
+
+_copy_chunk_size = 64 * 1024 * 1024  # 64MB
+
+
+def _copy_file(data: IO[AnyStr], f: IO[bytes]) -> int | None:
+    """
+    Copy a regular file in the kernel, without passing the content through the user space.
+
+    :return: size of the copied data, `None` if the data is not a regular file or the kernel can not copy it
+    """
+    if isinstance(data, TextIOBase):
+        return None
+    try:
+        src = data.fileno()
+    except (OSError, AttributeError):
+        return None
+    if not stat.S_ISREG(os.fstat(src).st_mode):
+        return None
+    offset = data.tell()
+    size = 0
+    for copy in (_copy_file_range, _sendfile):
+        try:
+            while True:
+                copied = copy(src, f.fileno(), offset + size)
+                if copied == 0:
+                    break
+                size += copied
+        except OSError as e:
+            # e.g. copy_file_range is not supported across file systems, fall back to the next one
+            logger.debug(f'failed to copy file by {copy.__name__}: {e}')
+            if size > 0:
+                raise
+            continue
+        data.seek(offset + size)
+        return size
+    return None
+
+
+def _copy_file_range(src: int, dst: int, offset: int) -> int:
+    # it may share the data blocks instead of copying on file systems such as btrfs and xfs
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError('copy_file_range is not available')
+    return os.copy_file_range(src, dst, _copy_chunk_size, offset)
+
+
+def _sendfile(src: int, dst: int, offset: int) -> int:
+    return os.sendfile(dst, src, offset, _copy_chunk_size)
+
+
+def _get_etag(path: Path) -> str:
+    info = path.stat()
+    return f'"{info.st_ino:x}-{info.st_mtime_ns:x}-{info.st_size:x}"'
 
 
 class Local(Storage):
-    _db: sqlite3.Connection
     _file_buffering = 10 * 1024 * 1024  # 10MB
+    _max_connections = 8
 
     def __init__(self, config: LocalConfig):
         self.public_endpoint = str(config.public_endpoint)
         self.base_dir = Path(config.base_dir)
         self.data_dir = self.base_dir / 'data'
+        self.fsync = config.fsync
+        self.db_path = self.base_dir / 'db.sqlite3'
+        # the connections are shared by the threads, the readers are not blocked by the writer in the WAL mode
+        self._connections: Pool[sqlite3.Connection] = Pool(
+            self._connect, lambda connection: connection.close(), max_size=self._max_connections)
 
     def start(self) -> None:
         if not self.base_dir.exists():
@@ -36,9 +97,9 @@ class Local(Storage):
             self.data_dir.mkdir(parents=True, exist_ok=True)
             self.base_dir.chmod(0o750)
             logger.info(f'created data directory {self.data_dir} (mod: {self.base_dir.stat().st_mode:o})')
-        with lock:
-            self._db = sqlite3.connect(self.base_dir / 'db.sqlite3')
-            self._db.execute('''
+        self._connections.open()
+        with self._transaction() as db:
+            db.execute('''
                 CREATE TABLE IF NOT EXISTS files (
                     key TEXT PRIMARY KEY,
                     type TEXT NOT NULL DEFAULT '',
@@ -47,57 +108,152 @@ class Local(Storage):
             ''')
 
     def stop(self) -> None:
-        with lock:
-            self._db.close()
+        self._connections.close()
 
-    def put(self, data: IO[AnyStr], key: str, *, content_type: str = '') -> ParseResult:
-        if key.startswith('/'):
-            key = key[1:]
+    def _connect(self) -> sqlite3.Connection:
+        # transactions are handled explicitly, and the connection is used by the threads one at a time
+        connection = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode = WAL')
+        # the WAL mode is durable with `NORMAL`, a commit is only lost by a power failure
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.execute('PRAGMA busy_timeout = 5000')
+        return connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connections.acquire() as db:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+
+    def _write(self, data: IO[AnyStr], key: str) -> int:
         path = self.data_dir / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # the file is published by an atomic rename, readers see either the old file or the complete new one
+        fd, tmp = tempfile.mkstemp(prefix=f'.{path.name}.', suffix='.tmp', dir=path.parent)
+        try:
+            with open(fd, 'wb') as f:
+                size = _copy_file(data, f)
+                if size is None:
+                    size = self._copy_chunks(data, f)
+                if self.fsync != 'none':
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.chmod(tmp, 0o640)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if self.fsync == 'full':
+            dir_fd = os.open(path.parent, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        return size
+
+    def _copy_chunks(self, data: IO[AnyStr], f: IO[bytes]) -> int:
         size = 0
-        with open(path, 'wb') as f:
-            while True:
-                chunk = data.read(self._file_buffering)
-                if isinstance(chunk, str):
-                    chunk_bytes = chunk.encode('utf-8')
-                else:
-                    chunk_bytes = chunk
-                if not chunk_bytes:
-                    break
-                size += len(chunk_bytes)
-                f.write(chunk_bytes)
-        path.chmod(0o640)
-        data.seek(0)
-        info = self.check(key)
-        with lock:
-            if info is None:
-                self._db.execute(
-                    'INSERT INTO files (key, type, size) VALUES (?, ?, ?)',
-                    (key, content_type, size),
-                )
+        while True:
+            chunk = data.read(self._file_buffering)
+            if isinstance(chunk, str):
+                chunk_bytes = chunk.encode('utf-8')
             else:
-                self._db.execute(
-                    'UPDATE files SET type = ?, size = ? WHERE key = ?',
-                    (content_type, size, key),
-                )
+                chunk_bytes = chunk
+            if not chunk_bytes:
+                break
+            size += len(chunk_bytes)
+            f.write(chunk_bytes)
+        return size
+
+    def _save_info(self, key: str, content_type: str, size: int) -> None:
+        with self._transaction() as db:
+            db.execute(
+                'INSERT INTO files (key, type, size) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET type = excluded.type, size = excluded.size',
+                (key, content_type, size),
+            )
+
+    def put(
+            self, data: IO[AnyStr], key: str, *, content_type: str = '', cache_control: str = ''
+    ) -> ParseResult:
+        # `Cache-Control` is sent by the web server, e.g. by `expires` of nginx for the locations of the keys
+        if key.startswith('/'):
+            key = key[1:]
+        size = self._write(data, key)
+        data.seek(0)
+        self._save_info(key, content_type, size)
         url = urljoin(self.public_endpoint, key)
         return urlparse(url)
 
+    def put_stream(
+            self, data: IO[bytes], key: str, *, content_type: str = '', content_encoding: str = '',
+            cache_control: str = ''
+    ) -> ObjectInfo:
+        # the files are served by a web server, which sends the metadata of the responses itself,
+        # e.g. `gzip_static` of nginx serves `{key}.gz` with `Content-Encoding: gzip`, see `put` for `Cache-Control`
+        if key.startswith('/'):
+            key = key[1:]
+        size = self._write(data, key)
+        self._save_info(key, content_type, size)
+        url = urljoin(self.public_endpoint, key)
+        return ObjectInfo(uri=urlparse(url), size=size, type=content_type, etag=_get_etag(self.data_dir / key))
+
     def check(self, key: str) -> ObjectInfo | None:
         if key.startswith('/'):
             key = key[1:]
-        with lock:
-            cursor = self._db.execute(
+        with self._connections.acquire() as db:
+            row = db.execute(
                 'SELECT type, size FROM files WHERE key = ?',
                 (key,),
-            )
-            row = cursor.fetchone()
+            ).fetchone()
         if row is None:
             return None
         content_type, size = row
         url = urljoin(self.public_endpoint, key)
         return ObjectInfo(type=content_type, uri=urlparse(url), size=size)
 
+    def files(self) -> list[tuple[str, int]]:
+        """
+        :return: key and size of all files
+        """
+        with self._connections.acquire() as db:
+            rows: list[tuple[str, int]] = db.execute('SELECT key, size FROM files').fetchall()
+        return rows
+
+    def list_objects(self, prefix: str) -> Iterator[tuple[str, int, datetime]]:
+        if prefix.startswith('/'):
+            prefix = prefix[1:]
+        with self._connections.acquire() as db:
+            rows = db.execute(
+                'SELECT key, size FROM files WHERE substr(key, 1, ?) = ?',
+                (len(prefix), prefix),
+            ).fetchall()
+        for key, size in rows:
+            try:
+                mtime = (self.data_dir / key).stat().st_mtime
+            except FileNotFoundError:
+                continue
+            yield key, size, datetime.fromtimestamp(mtime, timezone.utc)
+
+    def delete(self, keys: Iterable[str]) -> int:
+        removed = []
+        for key in (key[1:] if key.startswith('/') else key for key in keys):
+            try:
+                (self.data_dir / key).unlink(missing_ok=True)
+            except OSError as e:
+                logger.error(f'failed to delete {key}: {e}')
+                continue
+            removed.append((key,))
+        # the rows of the removed files are deleted at once
+        with self._transaction() as db:
+            count: int = db.executemany('DELETE FROM files WHERE key = ?', removed).rowcount
+        return count
+
     @contextmanager
     def get(self, key: str) -> Iterator[IO[bytes]]:
         if key.startswith('/'):
@@ -108,3 +264,19 @@ class Local(Storage):
         else:
             with open(path, 'rb') as f:
                 yield f
+
+    @contextmanager
+    def get_if_changed(self, key: str, etag: str | None) -> Iterator[tuple[IO[bytes], str | None] | None]:
+        if key.startswith('/'):
+            key = key[1:]
+        path = self.data_dir / key
+        if not path.exists():
+            yield EMPTY_FILE, None
+            return
+        current = _get_etag(path)
+        if current == etag:
+            logger.debug(f'not modified: {key}')
+            yield None
+            return
+        with open(path, 'rb') as f:
+            yield f, current
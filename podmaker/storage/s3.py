@@ -5,36 +5,84 @@ __all__ = ['S3']
 import base64
 import hashlib
 import logging
+import mimetypes
 import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
+from datetime import datetime, timedelta
+from fnmatch import fnmatchcase
+from io import SEEK_END, TextIOBase
 from tempfile import SpooledTemporaryFile
-from typing import IO, AnyStr, Iterator
+from time import monotonic
+from typing import IO, TYPE_CHECKING, Any, AnyStr, Iterable, Iterator
 from urllib.parse import ParseResult, urljoin, urlparse
 
 from podmaker.config import S3Config
 from podmaker.storage import ObjectInfo, Storage
 from podmaker.storage.core import EMPTY_FILE
+from podmaker.util import SingleFlight, retry
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3.type_defs import CompletedPartTypeDef
 
 logger = logging.getLogger(__name__)
 
 try:
     import boto3
-    from botocore.exceptions import ClientError
+    from botocore.exceptions import BotoCoreError, ClientError
+    from botocore.response import StreamingBody
 except ImportError:
     logger.error('boto3 is not installed, S3 storage is not available')
     sys.exit(1)
 
 
+def _md5(data: bytes) -> str:
+    return base64.b64encode(hashlib.md5(data).digest()).decode()
+
+
+def _md5_etag(md5: str) -> str:
+    # the ETag of an object uploaded in a single request is the hex md5 of its content
+    return f'"{base64.b64decode(md5).hex()}"'
+
+
+def _read_fully(data: IO[bytes], size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = data.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
 class S3(Storage):
     _md5_chunk_size = 10 * 1024 * 1024  # 10MB
     _file_buffering = 10 * 1024 * 1024  # 10MB
+    # the maximum number of keys in a request of `delete_objects`
+    _delete_batch_size = 1000
 
     def __init__(self, config: S3Config):
         self.s3 = boto3.resource(
             's3', endpoint_url=str(config.endpoint), aws_access_key_id=config.access_key,
             aws_secret_access_key=config.access_secret)
         self.bucket = self.s3.Bucket(config.bucket)
+        self.bucket_name = config.bucket
         self.public_endpoint = str(config.public_endpoint)
+        self.multipart_threshold = config.multipart_threshold
+        self.multipart_chunk_size = config.multipart_chunk_size
+        self.multipart_concurrency = config.multipart_concurrency
+        self.index_ttl = config.index_ttl
+        self.single_writer = config.single_writer
+        # the first pattern matching the key of an object gives its `Cache-Control`
+        self.cache_control = list(config.cache_control.items())
+        # ETags of the objects written by this instance
+        self._etags: dict[str, str] = {}
+        # objects under each prefix, with the time when the prefix was listed
+        self._indexes: dict[str, tuple[float, dict[str, ObjectInfo]]] = {}
+        self._index_lock = threading.Lock()
+        self._index_flight: SingleFlight[dict[str, ObjectInfo]] = SingleFlight()
 
     def _calculate_md5(self, data: IO[AnyStr]) -> str:
         logger.debug('calculate md5')
@@ -52,20 +100,178 @@ class S3(Storage):
         data.seek(0)
         return base64.b64encode(md5.digest()).decode()
 
-    def put(self, data: IO[AnyStr], key: str, *, content_type: str = '') -> ParseResult:
+    def put(
+            self, data: IO[AnyStr], key: str, *, content_type: str = '', cache_control: str = ''
+    ) -> ParseResult:
         if key.startswith('/'):
             key = key[1:]
-        md5 = self._calculate_md5(data)
-        logger.info(f'upload: {key} (md5: {md5})')
-        self.bucket.put_object(Key=key, ContentMD5=md5, Body=data, ContentType=content_type)
-        logger.info(f'uploaded: {key}')
+        size = data.seek(0, SEEK_END)
+        data.seek(0)
+        if size >= self.multipart_threshold and not isinstance(data, TextIOBase):
+            args = self._object_args(key, content_type, cache_control=cache_control)
+            _, etag = self._put_multipart(data, key, args)  # type: ignore[arg-type]
+            self._remember_etag(key, etag)
+        else:
+            md5 = self._calculate_md5(data)
+            logger.info(f'upload: {key} (md5: {md5})')
+            args = self._object_args(key, content_type, cache_control=cache_control)
+            self.bucket.put_object(Key=key, ContentMD5=md5, Body=data, **args)
+            logger.info(f'uploaded: {key}')
+            self._remember_etag(key, _md5_etag(md5))
         data.seek(0)
-        return self.get_uri(key)
+        uri = self.get_uri(key)
+        if isinstance(data, TextIOBase):
+            # the size of text is counted in characters, the prefix is listed again to get the size in bytes
+            self._update_index(key, None)
+        else:
+            self._update_index(key, ObjectInfo(uri=uri, size=size, type=content_type))
+        return uri
+
+    def put_stream(
+            self, data: IO[bytes], key: str, *, content_type: str = '', content_encoding: str = '',
+            cache_control: str = ''
+    ) -> ObjectInfo:
+        if key.startswith('/'):
+            key = key[1:]
+        # the size of a stream is unknown, it is uploaded in parts once it reaches the threshold
+        head = _read_fully(data, self.multipart_threshold)
+        args = self._object_args(key, content_type, content_encoding, cache_control)
+        if len(head) < self.multipart_threshold:
+            md5 = _md5(head)
+            logger.info(f'upload: {key} (md5: {md5})')
+            self.bucket.put_object(Key=key, ContentMD5=md5, Body=head, **args)
+            logger.info(f'uploaded: {key}')
+            size, etag = len(head), _md5_etag(md5)
+        else:
+            size, etag = self._put_multipart(data, key, args, head)
+        self._remember_etag(key, etag)
+        info = ObjectInfo(uri=self.get_uri(key), size=size, type=content_type, etag=etag)
+        self._update_index(key, info)
+        return info
+
+    def _iter_parts(self, data: IO[bytes], head: bytes) -> Iterator[bytes]:
+        buffer = head
+        while True:
+            while len(buffer) >= self.multipart_chunk_size:
+                yield buffer[:self.multipart_chunk_size]
+                buffer = buffer[self.multipart_chunk_size:]
+            chunk = _read_fully(data, self.multipart_chunk_size - len(buffer))
+            if not chunk:
+                break
+            buffer += chunk
+        if buffer:
+            yield buffer
+
+    @retry(3, wait=timedelta(seconds=1), catch=(ClientError, BotoCoreError), logger=logger)
+    def _upload_part(self, key: str, upload_id: str, number: int, part: bytes) -> CompletedPartTypeDef:
+        response = self.s3.meta.client.upload_part(
+            Bucket=self.bucket_name, Key=key, UploadId=upload_id, PartNumber=number, Body=part, ContentMD5=_md5(part))
+        logger.debug(f'uploaded part {number} of {key}')
+        return {'ETag': response['ETag'], 'PartNumber': number}
+
+    def _object_args(
+            self, key: str, content_type: str, content_encoding: str = '', cache_control: str = ''
+    ) -> dict[str, Any]:
+        """
+        :return: the arguments of the metadata of an object, they are given when the object is created
+        """
+        args: dict[str, Any] = {'ContentType': content_type}
+        if content_encoding:
+            args['ContentEncoding'] = content_encoding
+        if not cache_control:
+            cache_control = next((value for pattern, value in self.cache_control if fnmatchcase(key, pattern)), '')
+        if cache_control:
+            args['CacheControl'] = cache_control
+        return args
+
+    def _put_multipart(
+            self, data: IO[bytes], key: str, args: dict[str, Any], head: bytes = b''
+    ) -> tuple[int, str]:
+        """
+        Upload the data in parts, parts are read once and uploaded in parallel,
+        at most `multipart_concurrency` parts are kept in memory besides the one being read.
+
+        :return: size and ETag of the data
+        """
+        client = self.s3.meta.client
+        upload_id = client.create_multipart_upload(
+            Bucket=self.bucket_name, Key=key, **args)['UploadId']
+        logger.info(f'upload in parts: {key}')
+        size = 0
+        slots = threading.BoundedSemaphore(self.multipart_concurrency)
+        futures: list[Future[CompletedPartTypeDef]] = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.multipart_concurrency, thread_name_prefix='s3_part') as executor:
+                for number, part in enumerate(self._iter_parts(data, head), start=1):
+                    slots.acquire()
+                    # stop reading if a part has failed after its retries
+                    for future in futures:
+                        if future.done() and future.exception():
+                            slots.release()
+                            future.result()
+                    size += len(part)
+                    future = executor.submit(self._upload_part, key, upload_id, number, part)
+                    future.add_done_callback(lambda _: slots.release())
+                    futures.append(future)
+                parts = [future.result() for future in futures]
+            response = client.complete_multipart_upload(
+                Bucket=self.bucket_name, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts})
+        except BaseException:
+            logger.error(f'abort uploading in parts: {key}')
+            for future in futures:
+                future.cancel()
+            client.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+            raise
+        logger.info(f'uploaded: {key} (size: {size}, parts: {len(futures)})')
+        return size, response['ETag']
+
+    def _remember_etag(self, key: str, etag: str) -> None:
+        if self.single_writer:
+            self._etags[key] = etag
+
+    def _load_index(self, prefix: str) -> dict[str, ObjectInfo]:
+        logger.debug(f'list: {prefix}')
+        index = {}
+        paginator = self.s3.meta.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix, Delimiter='/'):
+            for obj in page.get('Contents', []):
+                # the content type is not listed, it is guessed from the key
+                index[obj['Key']] = ObjectInfo(
+                    uri=self.get_uri(obj['Key']),
+                    size=obj['Size'],
+                    type=mimetypes.guess_type(obj['Key'])[0] or '',
+                )
+        with self._index_lock:
+            self._indexes[prefix] = (monotonic(), index)
+        logger.info(f'indexed {len(index)} objects: {prefix}')
+        return index
+
+    def _get_index(self, prefix: str) -> dict[str, ObjectInfo]:
+        with self._index_lock:
+            indexed = self._indexes.get(prefix)
+        if indexed is not None and monotonic() - indexed[0] < self.index_ttl:
+            return indexed[1]
+        return self._index_flight.do(prefix, lambda: self._load_index(prefix))
+
+    def _update_index(self, key: str, info: ObjectInfo | None) -> None:
+        """
+        :param info: info of the uploaded object, `None` to drop the index of its prefix
+        """
+        prefix = key[:key.rfind('/') + 1]
+        with self._index_lock:
+            if info is None:
+                self._indexes.pop(prefix, None)
+                return
+            indexed = self._indexes.get(prefix)
+            if indexed is not None:
+                indexed[1][key] = info
 
     def check(self, key: str) -> ObjectInfo | None:
         logger.debug(f'check: {key}')
         if key.startswith('/'):
             key = key[1:]
+        if self.index_ttl:
+            return self._get_index(key[:key.rfind('/') + 1]).get(key)
         try:
             info = self.bucket.Object(key=key)
             return ObjectInfo(
@@ -76,25 +282,93 @@ class S3(Storage):
         except ClientError:
             return None
 
+    def list_objects(self, prefix: str) -> Iterator[tuple[str, int, datetime]]:
+        if prefix.startswith('/'):
+            prefix = prefix[1:]
+        paginator = self.s3.meta.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'], obj['Size'], obj['LastModified']
+
+    @retry(3, wait=timedelta(seconds=1), catch=(ClientError, BotoCoreError), logger=logger)
+    def _delete_batch(self, keys: list[str]) -> list[str]:
+        """
+        :return: the deleted keys
+        """
+        response = self.s3.meta.client.delete_objects(
+            Bucket=self.bucket_name, Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True})
+        # only the failures are returned in the quiet mode
+        failed = set()
+        for error in response.get('Errors', []):
+            logger.error(f'failed to delete {error.get("Key")}: {error.get("Code")} {error.get("Message")}')
+            failed.add(error.get('Key'))
+        return [key for key in keys if key not in failed]
+
+    def delete(self, keys: Iterable[str]) -> int:
+        keys = [key[1:] if key.startswith('/') else key for key in keys]
+        count = 0
+        for start in range(0, len(keys), self._delete_batch_size):
+            deleted = self._delete_batch(keys[start:start + self._delete_batch_size])
+            logger.info(f'deleted {len(deleted)} objects')
+            with self._index_lock:
+                for key in deleted:
+                    indexed = self._indexes.get(key[:key.rfind('/') + 1])
+                    if indexed is not None:
+                        indexed[1].pop(key, None)
+                    self._etags.pop(key, None)
+            count += len(deleted)
+        return count
+
     def get_uri(self, key: str) -> ParseResult:
         url = urljoin(self.public_endpoint, key)
         return urlparse(url)
 
+    @contextmanager
+    def _spool(self, body: StreamingBody) -> Iterator[IO[bytes]]:
+        with SpooledTemporaryFile(buffering=self._file_buffering) as f:
+            while True:
+                chunk = body.read(self._file_buffering)
+                if not chunk:
+                    break
+                f.write(chunk)
+            f.seek(0)
+            yield f
+
     @contextmanager
     def get(self, key: str) -> Iterator[IO[bytes]]:
         logger.info(f'get: {key}')
         if key.startswith('/'):
             key = key[1:]
-        with SpooledTemporaryFile(buffering=self._file_buffering) as f:
-            try:
+        try:
+            obj = self.bucket.Object(key=key).get()
+        except ClientError:
+            logger.debug(f'not found: {key}')
+            yield EMPTY_FILE
+            return
+        with self._spool(obj['Body']) as f:
+            yield f
+
+    @contextmanager
+    def get_if_changed(self, key: str, etag: str | None) -> Iterator[tuple[IO[bytes], str | None] | None]:
+        if key.startswith('/'):
+            key = key[1:]
+        if etag is not None and self.single_writer and self._etags.get(key) == etag:
+            logger.debug(f'not modified since written: {key}')
+            yield None
+            return
+        logger.info(f'get: {key} (if none match: {etag})')
+        try:
+            if etag:
+                obj = self.bucket.Object(key=key).get(IfNoneMatch=etag)
+            else:
                 obj = self.bucket.Object(key=key).get()
-                while True:
-                    chunk = obj['Body'].read(self._file_buffering)
-                    if not chunk:
-                        break
-                    f.write(chunk)
-                f.seek(0)
-                yield f
-            except ClientError:
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+                logger.debug(f'not modified: {key}')
+                yield None
+            else:
                 logger.debug(f'not found: {key}')
-                yield EMPTY_FILE
+                yield EMPTY_FILE, None
+            return
+        with self._spool(obj['Body']) as f:
+            yield f, obj['ETag']
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+__all__ = ['TieredStorage']
+
+import dataclasses
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from io import SEEK_END, BufferedReader, RawIOBase
+from tempfile import TemporaryFile
+from typing import IO, Any, AnyStr, Iterable, Iterator
+from urllib.parse import ParseResult
+
+from podmaker.storage.core import EMPTY_FILE, ObjectInfo, Storage
+from podmaker.storage.local import Local
+
+logger = logging.getLogger(__name__)
+
+# an object larger than this fraction of the cache would evict too many others, it is only kept in the origin
+_max_object_ratio = 16
+
+
+class _ChainedReader(RawIOBase):
+    def __init__(self, *streams: IO[bytes]):
+        self._streams = list(streams)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        while self._streams:
+            chunk = self._streams[0].read(len(b))
+            if chunk:
+                b[:len(chunk)] = chunk
+                return len(chunk)
+            self._streams.pop(0)
+        return 0
+
+
+class TieredStorage(Storage):
+    """
+    A storage which keeps a bounded cache of another storage on the local disk.
+
+    The origin is the source of truth, writes go through to it before the cache, so that the cache never has
+    an object which the origin does not have. Reads are served by the cache if it has the object, otherwise
+    the object is read from the origin and kept in the cache. The least recently used objects are evicted
+    when the cache exceeds its size, and the cache is reconciled with its files when it is started again.
+
+    It assumes podmaker is the only writer of the origin, the cached objects are not revalidated.
+    """
+
+    def __init__(self, storage: Storage, cache: Local, max_size: int):
+        """
+        :param storage: the origin
+        :param cache: the local storage used as the cache
+        :param max_size: the maximum size of the cache in bytes
+        """
+        self.storage = storage
+        self.cache = cache
+        self.max_size = max_size
+        self._max_object_size = max_size // _max_object_ratio
+        # cached keys and their sizes, in the order of use
+        self._usage: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(key: str) -> str:
+        return key[1:] if key.startswith('/') else key
+
+    def start(self) -> None:
+        self.storage.start()
+        self.cache.start()
+        self._recover()
+
+    def stop(self) -> None:
+        self.cache.stop()
+        self.storage.stop()
+
+    def _recover(self) -> None:
+        entries = []
+        for key, size in self.cache.files():
+            try:
+                mtime = (self.cache.data_dir / key).stat().st_mtime
+            except FileNotFoundError:
+                logger.warning(f'cached file is missing: {key}')
+                self.cache.delete([key])
+                continue
+            entries.append((mtime, key, size))
+        known = {key for _, key, _ in entries}
+        # files without a row were written by an interrupted put, or are temporary files of an interrupted write
+        for path in self.cache.data_dir.rglob('*'):
+            if path.is_file() and path.relative_to(self.cache.data_dir).as_posix() not in known:
+                logger.info(f'removing untracked cached file: {path}')
+                path.unlink(missing_ok=True)
+        with self._lock:
+            self._usage.clear()
+            self._size = 0
+            for _, key, size in sorted(entries):
+                self._usage[key] = size
+                self._size += size
+        self._evict()
+        logger.info(f'local cache: {len(self._usage)} files, {self._size} bytes')
+
+    def _touch(self, key: str) -> None:
+        with self._lock:
+            if key in self._usage:
+                self._usage.move_to_end(key)
+
+    def _add(self, key: str, size: int) -> None:
+        with self._lock:
+            self._size += size - self._usage.pop(key, 0)
+            self._usage[key] = size
+        self._evict()
+
+    def _evict(self) -> None:
+        evicted = []
+        with self._lock:
+            while self._size > self.max_size and self._usage:
+                key, size = self._usage.popitem(last=False)
+                self._size -= size
+                evicted.append(key)
+        if evicted:
+            logger.debug(f'evicting cached files: {evicted}')
+            self.cache.delete(evicted)
+
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            self._size -= self._usage.pop(key, 0)
+        self.cache.delete([key])
+
+    def _keep(self, data: IO[bytes], key: str, content_type: str, size: int) -> ObjectInfo | None:
+        """
+        :return: info of the cached object, `None` if the object is not cached
+        """
+        if size > self._max_object_size:
+            # the cached version is outdated
+            self._discard(key)
+            return None
+        info = self.cache.put_stream(data, key, content_type=content_type)
+        self._add(key, size)
+        return info
+
+    def put(
+            self, data: IO[AnyStr], key: str, *, content_type: str = '', cache_control: str = ''
+    ) -> ParseResult:
+        key = self._normalize(key)
+        result = self.storage.put(data, key, content_type=content_type, cache_control=cache_control)
+        # the data is rewound by the origin
+        self.cache.put(data, key, content_type=content_type)
+        info = self.cache.check(key)
+        if info is not None and info.size <= self._max_object_size:
+            self._add(key, info.size)
+        else:
+            self._discard(key)
+        return result
+
+    def put_stream(
+            self, data: IO[bytes], key: str, *, content_type: str = '', content_encoding: str = '',
+            cache_control: str = ''
+    ) -> ObjectInfo:
+        key = self._normalize(key)
+        # the object is spooled in the cache dir, so that it is copied in the kernel after being uploaded
+        with TemporaryFile(dir=self.cache.base_dir) as f:
+            size = 0
+            while size <= self._max_object_size:
+                chunk = data.read(self._max_object_size + 1 - size)
+                if not chunk:
+                    break
+                f.write(chunk)
+                size += len(chunk)
+            f.seek(0)
+            if size > self._max_object_size:
+                # too large to be cached, the rest is streamed to the origin
+                self._discard(key)
+                return self.storage.put_stream(
+                    BufferedReader(_ChainedReader(f, data)), key,
+                    content_type=content_type, content_encoding=content_encoding, cache_control=cache_control)
+            info = self.storage.put_stream(
+                f, key, content_type=content_type, content_encoding=content_encoding, cache_control=cache_control)
+            f.seek(0)
+            cached = self._keep(f, key, content_type, size)
+        if cached is not None:
+            # the cached object is read by `get_if_changed` with the etag of the cache
+            info = dataclasses.replace(info, etag=cached.etag)
+        return info
+
+    def check(self, key: str) -> ObjectInfo | None:
+        key = self._normalize(key)
+        info = self.cache.check(key)
+        if info is not None:
+            self._touch(key)
+            return info
+        return self.storage.check(key)
+
+    def list_objects(self, prefix: str) -> Iterator[tuple[str, int, datetime]]:
+        return self.storage.list_objects(prefix)
+
+    def delete(self, keys: Iterable[str]) -> int:
+        keys = [self._normalize(key) for key in keys]
+        count = self.storage.delete(keys)
+        with self._lock:
+            for key in keys:
+                self._size -= self._usage.pop(key, 0)
+        self.cache.delete(keys)
+        return count
+
+    def _fetch(self, key: str) -> bool:
+        """
+        Copy an object from the origin to the cache.
+
+        :return: whether the object is cached
+        """
+        info = self.storage.check(key)
+        if info is None or info.size > self._max_object_size:
+            return False
+        with self.storage.get(key) as f:
+            if f is EMPTY_FILE:
+                return False
+            size = f.seek(0, SEEK_END)
+            f.seek(0)
+            return self._keep(f, key, info.type, size) is not None
+
+    def _cached(self, key: str) -> bool:
+        if self.cache.check(key) is not None:
+            self._touch(key)
+            return True
+        return self._fetch(key)
+
+    @contextmanager
+    def get(self, key: str) -> Iterator[IO[bytes]]:
+        key = self._normalize(key)
+        storage = self.cache if self._cached(key) else self.storage
+        with storage.get(key) as f:
+            yield f
+
+    @contextmanager
+    def get_if_changed(self, key: str, etag: str | None) -> Iterator[tuple[IO[bytes], str | None] | None]:
+        # the etags of cached objects are given by the cache, and those of the others by the origin
+        key = self._normalize(key)
+        storage = self.cache if self._cached(key) else self.storage
+        with storage.get_if_changed(key, etag) as result:
+            yield result
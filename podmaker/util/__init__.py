@@ -1,4 +1,8 @@
-__all__ = ['exit_signal', 'ExitSignalError', 'retry']
+__all__ = ['exit_signal', 'ExitSignalError', 'retry', 'Pool', 'JobQueue', 'SingleFlight', 'SharedIterable', 'RateLimiter']
 
 from podmaker.util.exit import ExitSignalError, exit_signal
+from podmaker.util.job_queue import JobQueue
+from podmaker.util.pool import Pool
+from podmaker.util.rate_limit import RateLimiter
 from podmaker.util.retry_util import retry
+from podmaker.util.singleflight import SharedIterable, SingleFlight
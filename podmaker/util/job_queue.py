@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Literal
+
+from podmaker.util.exit import exit_signal
+
+logger = logging.getLogger(__name__)
+
+Order = Literal['fifo', 'priority']
+GroupHook = Callable[[str, int], None]
+
+
+def _do_nothing(*_: object) -> None:
+    pass
+
+
+@dataclass
+class _Job:
+    key: str
+    func: Callable[[], None]
+    group: str
+    limit: int | None
+    priority: int
+    seq: int
+
+
+class JobQueue:
+    """
+    A queue of background jobs, executed by its own pool of worker threads.
+
+    Jobs are deduplicated by key and belong to a group, such as a source,
+    the number of running jobs of a group can be capped independently of the number of workers.
+    """
+
+    def __init__(self, name: str, workers: int, order: Order = 'fifo', on_group_done: GroupHook = _do_nothing):
+        """
+        :param name: name of the queue, used by the threads and logs
+        :param workers: number of worker threads, it caps the number of running jobs of all groups
+        :param order: `fifo` runs jobs in order of submission,
+                      `priority` runs jobs with higher priority first, then in order of submission
+        :param on_group_done: called with the group and the number of succeeded jobs,
+                              when the group has no pending or running jobs
+        """
+        self.name = name
+        self.workers = workers
+        self.order = order
+        self.on_group_done = on_group_done
+        self._pending: list[_Job] = []
+        self._running: dict[str, _Job] = {}
+        self._succeeded: dict[str, int] = {}
+        # number of running group hooks, they may submit new jobs
+        self._hooks = 0
+        self._threads: list[threading.Thread] = []
+        self._seq = itertools.count()
+        self._is_stopped = True
+        self._cond = threading.Condition()
+
+    def start(self) -> None:
+        with self._cond:
+            self._is_stopped = False
+            self._threads = [
+                threading.Thread(target=self._work, name=f'{self.name}_{i}')
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """
+        Drop pending jobs and wait for running jobs.
+        """
+        with self._cond:
+            self._is_stopped = True
+            if self._pending:
+                logger.warning(f'[{self.name}] drop {len(self._pending)} pending jobs')
+            self._pending.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def join(self) -> None:
+        """
+        Wait until all jobs are done.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._is_stopped or not (self._pending or self._running or self._hooks))
+
+    def submit(
+            self, key: str, func: Callable[[], None], *, group: str, limit: int | None = None, priority: int = 0
+    ) -> bool:
+        """
+        :param key: jobs with the same key are executed once at a time
+        :param limit: maximum number of running jobs of the group
+        :return: whether the job is queued, `False` if a job with the same key is pending or running
+        """
+        with self._cond:
+            if self._is_stopped:
+                raise RuntimeError(f'queue {self.name} is stopped')
+            if key in self._running or any(job.key == key for job in self._pending):
+                return False
+            self._pending.append(_Job(key, func, group, limit, priority, next(self._seq)))
+            self._cond.notify_all()
+        logger.debug(f'[{self.name}] job queued: {key}')
+        return True
+
+    def _running_count(self, group: str) -> int:
+        return sum(1 for job in self._running.values() if job.group == group)
+
+    def _is_group_idle(self, group: str) -> bool:
+        return not any(job.group == group for job in self._pending) and self._running_count(group) == 0
+
+    def _next(self) -> _Job | None:
+        eligible = [
+            job for job in self._pending
+            if job.limit is None or self._running_count(job.group) < job.limit
+        ]
+        if not eligible:
+            return None
+        if self.order == 'priority':
+            job = min(eligible, key=lambda j: (-j.priority, j.seq))
+        else:
+            job = min(eligible, key=lambda j: j.seq)
+        self._pending.remove(job)
+        self._running[job.key] = job
+        return job
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                job = None
+                while not self._is_stopped:
+                    job = self._next()
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                if job is None:
+                    return
+            self._run(job)
+
+    def _run(self, job: _Job) -> None:
+        is_succeeded = False
+        try:
+            exit_signal.check()
+            job.func()
+            is_succeeded = True
+        except BaseException as e:
+            logger.error(f'[{self.name}] job failed: {job.key} due to {e}')
+        with self._cond:
+            del self._running[job.key]
+            if is_succeeded:
+                self._succeeded[job.group] = self._succeeded.get(job.group, 0) + 1
+            is_group_done = self._is_group_idle(job.group)
+            if is_group_done:
+                succeeded = self._succeeded.pop(job.group, 0)
+                self._hooks += 1
+            self._cond.notify_all()
+        if not is_group_done:
+            return
+        try:
+            self.on_group_done(job.group, succeeded)
+        except BaseException as e:
+            logger.error(f'[{self.name}] group hook failed: {job.group} due to {e}')
+        finally:
+            with self._cond:
+                self._hooks -= 1
+                self._cond.notify_all()
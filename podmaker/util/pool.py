@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import Callable, Generic, Iterator, TypeVar
+
+T = TypeVar('T')
+
+
+class PoolClosedError(Exception):
+    pass
+
+
+class Pool(Generic[T]):
+    """
+    A thread-safe pool of long-lived objects.
+    Objects are created on demand, and kept for reuse after being released until the pool is closed.
+    At most `max_size` objects exist at once, callers wait for a released object above it.
+    """
+
+    def __init__(
+            self,
+            factory: Callable[[], T],
+            finalizer: Callable[[T], None] = lambda _: None,
+            max_size: int | None = None,
+    ):
+        """
+        :param factory: create a new object
+        :param finalizer: release the resources of an object when the pool is closed
+        :param max_size: the maximum number of objects, `None` for no limit
+        """
+        self._factory = factory
+        self._finalizer = finalizer
+        self._max_size = max_size
+        self._idle: list[T] = []
+        # objects created and not finalized, including the acquired ones
+        self._size = 0
+        self._is_closed = True
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def open(self) -> None:
+        with self._lock:
+            self._is_closed = False
+
+    def close(self) -> None:
+        with self._lock:
+            self._is_closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._released.notify_all()
+        for obj in idle:
+            self._finalizer(obj)
+
+    def _take(self) -> T | None:
+        """
+        :return: an idle object, `None` if a new object should be created
+        """
+        with self._released:
+            while True:
+                if self._is_closed:
+                    raise PoolClosedError('pool is closed')
+                if self._idle:
+                    return self._idle.pop()
+                if self._max_size is None or self._size < self._max_size:
+                    self._size += 1
+                    return None
+                self._released.wait()
+
+    def _create(self) -> T:
+        try:
+            return self._factory()
+        except BaseException:
+            self._discard()
+            raise
+
+    def _discard(self) -> None:
+        with self._released:
+            self._size -= 1
+            self._released.notify()
+
+    @contextmanager
+    def acquire(self) -> Iterator[T]:
+        idle = self._take()
+        obj = idle if idle is not None else self._create()
+        try:
+            yield obj
+        finally:
+            with self._released:
+                is_closed = self._is_closed
+                if not is_closed:
+                    self._idle.append(obj)
+                    self._released.notify()
+            if is_closed:
+                self._discard()
+                self._finalizer(obj)
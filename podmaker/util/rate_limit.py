@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import logging
+import threading
+from contextlib import contextmanager
+from time import monotonic, sleep
+from typing import Callable, Iterator
+
+from podmaker.util.exit import exit_signal
+
+logger = logging.getLogger(__name__)
+
+# the longest sleep between checks of the exit signal
+_max_sleep = 1.0
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket, shared by the callers of the same upstream budget.
+
+    The rate adapts to throttling in the AIMD way: it is halved when the upstream throttles,
+    and grows back linearly towards the configured rate with each successful request.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, *, min_rate: float | None = None):
+        """
+        :param name: name of the limiter, used by the logs
+        :param rate: the maximum number of requests per second, `0` for no limit
+        :param burst: the maximum number of requests sent at once
+        :param min_rate: the rate never drops below it, default to 1/16 of the rate
+        """
+        self.name = name
+        self.max_rate = rate
+        self.min_rate = rate / 16 if min_rate is None else min_rate
+        self.burst = burst
+        self.rate = rate
+        # the rate is recovered from the minimum to the maximum in about 100 successful requests
+        self._increase = (self.max_rate - self.min_rate) / 100
+        self._tokens = float(burst)
+        self._updated_at = monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self) -> None:
+        """
+        Wait until a request is allowed.
+        """
+        if self.max_rate == 0:
+            return
+        while True:
+            with self._lock:
+                self._refill(monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            exit_signal.check()
+            sleep(min(wait, _max_sleep))
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self._increase)
+
+    def on_throttled(self) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            # drop the burst, the upstream has to recover before more requests
+            self._tokens = min(self._tokens, 0)
+        logger.warning(f'[{self.name}] throttled, slow down to {self.rate:.3f} requests per second')
+
+    @contextmanager
+    def limit(self, is_throttled: Callable[[BaseException], bool]) -> Iterator[None]:
+        """
+        Wait until a request is allowed, then adapt the rate to the result of the request.
+
+        :param is_throttled: whether an error raised by the request means the upstream throttles
+        """
+        self.acquire()
+        try:
+            yield
+        except BaseException as e:
+            if is_throttled(e):
+                self.on_throttled()
+            raise
+        self.on_success()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, Generic, Hashable, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+
+class SingleFlight(Generic[T]):
+    """
+    Concurrent calls with the same key wait for one in-flight call and share its result.
+    The result is not kept, a call after the in-flight one has finished is executed again.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[Hashable, Future[T]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> T:
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if flight is None:
+                flight = self._flights[key] = Future()
+        if not is_leader:
+            return flight.result()
+        try:
+            result = func()
+            flight.set_result(result)
+            return result
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+
+class SharedIterable(Generic[T]):
+    """
+    An iterable over a lazy iterator which can be iterated several times, even concurrently.
+    Items are pulled from the iterator once and buffered for the other iterations.
+    """
+
+    def __init__(self, iterator: Iterable[T]):
+        self._iterator = iter(iterator)
+        self._buffer: list[T] = []
+        self._is_exhausted = False
+        self._lock = threading.Lock()
+
+    def _fill(self, index: int) -> bool:
+        """
+        :return: whether the item at the index is buffered
+        """
+        with self._lock:
+            while index >= len(self._buffer) and not self._is_exhausted:
+                try:
+                    self._buffer.append(next(self._iterator))
+                except StopIteration:
+                    self._is_exhausted = True
+            return index < len(self._buffer)
+
+    def __iter__(self) -> Iterator[T]:
+        index = 0
+        while self._fill(index):
+            yield self._buffer[index]
+            index += 1
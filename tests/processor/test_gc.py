@@ -0,0 +1,101 @@
+import os
+import time
+import unittest
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any
+from unittest import mock
+from urllib.parse import urlparse
+
+from podmaker.config import GCConfig, LocalConfig, SourceConfig
+from podmaker.fetcher import Fetcher
+from podmaker.processor.gc import GarbageCollector
+from podmaker.storage.local import Local
+
+endpoint = 'https://example.com/podcasts/'
+
+
+def create_podcast(*keys: str) -> Any:
+    episodes = []
+    for key in keys:
+        episode = mock.Mock()
+        episode.enclosure.ensure.return_value.url = urlparse(endpoint + key)
+        episodes.append(episode)
+    podcast = mock.Mock()
+    podcast.items.ensure.return_value = episodes
+    return podcast
+
+
+class TestGarbageCollector(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = TemporaryDirectory()
+        self.storage = Local(LocalConfig(dest='local', base_dir=self.dir.name, public_endpoint=endpoint))
+        self.storage.start()
+        self.source = SourceConfig(id='source', url='https://www.youtube.com/playlist?list=1')
+        self.fetcher = mock.Mock(spec=Fetcher)
+        self.fetcher.shared_keys.return_value = set()
+
+    def tearDown(self) -> None:
+        self.storage.stop()
+        self.dir.cleanup()
+
+    def put(self, key: str, *, age: int = 30 * 24 * 60 * 60) -> None:
+        self.storage.put_stream(BytesIO(b'audio'), key)
+        modified = time.time() - age
+        os.utime(Path(self.dir.name) / 'data' / key, (modified, modified))
+
+    def test_collect(self) -> None:
+        self.put('source/feed.rss')
+        self.put('source/youtube/kept.mp3')
+        self.put('source/youtube/orphan.mp3')
+        self.put('source/youtube/orphan.m4a')
+        self.put('source/youtube/orphan.opus')
+        self.put('source/youtube/recent.mp3', age=60)
+        self.put('source/youtube/notes.txt')
+        self.put('other/youtube/orphan.mp3')
+        gc = GarbageCollector(self.storage, GCConfig(enabled=True))
+        # the audio is matched without the MIME types of the host
+        with mock.patch('mimetypes.guess_type', return_value=(None, None)):
+            stats = gc.collect(self.source, create_podcast('source/youtube/kept.mp3'), self.fetcher)
+        assert stats is not None
+        self.assertEqual((5, 1, 1, 3, 3), (stats.scanned, stats.referenced, stats.recent, stats.orphaned, stats.deleted))
+        self.assertEqual(15, stats.orphaned_bytes)
+        keys = {key for key, _, _ in self.storage.list_objects('')}
+        self.assertEqual(
+            {
+                'source/feed.rss', 'source/youtube/kept.mp3', 'source/youtube/recent.mp3', 'source/youtube/notes.txt',
+                'other/youtube/orphan.mp3',
+            },
+            keys,
+        )
+        # it is not due until the interval has passed
+        self.assertIsNone(gc.collect(self.source, create_podcast(), self.fetcher))
+
+    def test_dry_run(self) -> None:
+        self.put('source/youtube/orphan.mp3')
+        self.put('_shared/youtube/shared.mp3')
+        self.fetcher.shared_keys.return_value = {'_shared/youtube/shared.mp3'}
+        gc = GarbageCollector(self.storage, GCConfig(enabled=True, dry_run=True))
+        stats = gc.collect(self.source, create_podcast(), self.fetcher)
+        assert stats is not None
+        self.assertEqual((1, 0, 1), (stats.orphaned, stats.deleted, stats.shared))
+        self.fetcher.release.assert_not_called()
+        self.assertEqual(2, len(list(self.storage.list_objects(''))))
+
+    def test_shared(self) -> None:
+        self.put('_shared/youtube/released.mp3')
+        self.put('_shared/youtube/referenced.mp3')
+        self.put('_shared/youtube/kept.mp3')
+        self.fetcher.shared_keys.return_value = {
+            '_shared/youtube/released.mp3', '_shared/youtube/referenced.mp3', '_shared/youtube/kept.mp3',
+        }
+        self.fetcher.release.side_effect = lambda _, key: key == '_shared/youtube/released.mp3'
+        gc = GarbageCollector(self.storage, GCConfig(enabled=True))
+        stats = gc.collect(self.source, create_podcast('_shared/youtube/kept.mp3'), self.fetcher)
+        assert stats is not None
+        self.assertEqual((1, 1, 1), (stats.referenced, stats.shared, stats.deleted))
+        self.assertEqual(2, self.fetcher.release.call_count)
+        self.assertIsNone(self.storage.check('_shared/youtube/released.mp3'))
+        self.assertIsNotNone(self.storage.check('_shared/youtube/referenced.mp3'))
+        self.assertEqual(3, gc.stats.scanned)
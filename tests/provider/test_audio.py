@@ -0,0 +1,83 @@
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from podmaker.fetcher.audio import AudioProfile
+
+
+def _fake_ffmpeg(code: int) -> mock.Mock:
+    # replace ffmpeg with a python process which echoes the input file and exits with the code
+    script = f'import shutil, sys; shutil.copyfileobj(open(sys.argv[1], "rb"), sys.stdout.buffer); sys.exit({code})'
+
+    def args(path: Path, *_: object) -> list[str]:
+        return [sys.executable, '-c', script, str(path)]
+
+    return mock.Mock(side_effect=args)
+
+
+class TestAudioProfile(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory(prefix='podmaker_test_')
+        self.data = b'audio' * 100000
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def write(self, name: str) -> Path:
+        path = Path(self.tmp_dir.name) / name
+        path.write_bytes(self.data)
+        return path
+
+    def test_native(self) -> None:
+        path = self.write('audio.m4a')
+        with mock.patch('subprocess.run') as run, AudioProfile('m4a').convert(path, 'mp4a.40.2') as f:
+            self.assertEqual(self.data, f.read())
+        run.assert_not_called()
+
+    def test_stream(self) -> None:
+        path = self.write('audio.webm')
+        with mock.patch('podmaker.fetcher.audio._ffmpeg_args', _fake_ffmpeg(0)):
+            with AudioProfile('mp3').convert(path, 'opus') as f:
+                self.assertEqual(self.data, f.read())
+
+    def test_stream_failed(self) -> None:
+        path = self.write('audio.webm')
+        with mock.patch('podmaker.fetcher.audio._ffmpeg_args', _fake_ffmpeg(1)):
+            with AudioProfile('opus').convert(path, 'opus') as f:
+                self.assertRaises(RuntimeError, f.read)
+
+    def test_format_selector(self) -> None:
+        self.assertEqual('ba', AudioProfile('mp3').format_selector)
+        self.assertEqual('wa[abr>=64]/ba', AudioProfile('mp3', 64).format_selector)
+        self.assertEqual('ba[ext=m4a]/ba', AudioProfile('m4a').format_selector)
+        self.assertEqual(
+            'wa[acodec=opus][abr>=64]/ba[acodec=opus]/wa[abr>=64]/ba',
+            AudioProfile('opus', 64).format_selector,
+        )
+
+    def test_bitrate(self) -> None:
+        path = self.write('audio.webm')
+        for profile, args in (
+                (AudioProfile('mp3'), ['-c:a', 'libmp3lame', '-q:a', '5']),
+                (AudioProfile('mp3', 64), ['-c:a', 'libmp3lame', '-b:a', '64k']),
+        ):
+            with mock.patch('podmaker.fetcher.audio._stream') as stream, profile.convert(path, 'opus'):
+                pass
+            stream.assert_called_once_with(path, [*args, '-f', 'mp3'])
+
+    def test_keep(self) -> None:
+        path = self.write('audio.webm')
+        with mock.patch('podmaker.fetcher.audio._ffmpeg_args', _fake_ffmpeg(1)):
+            with AudioProfile('mp3').convert(path, 'opus', keep=True) as f:
+                self.assertRaises(RuntimeError, f.read)
+        self.assertFalse(path.with_name('audio.converted.mp3').exists())
+        with mock.patch('podmaker.fetcher.audio._ffmpeg_args', _fake_ffmpeg(0)):
+            with AudioProfile('mp3').convert(path, 'opus', keep=True) as f:
+                self.assertEqual(self.data, f.read())
+        self.assertEqual(self.data, path.with_name('audio.converted.mp3').read_bytes())
+        # the converted audio is reused without running ffmpeg
+        with mock.patch('podmaker.fetcher.audio._stream') as stream, AudioProfile('mp3').convert(path, 'opus') as f:
+            self.assertEqual(self.data, f.read())
+        stream.assert_not_called()
@@ -0,0 +1,41 @@
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from podmaker.fetcher.cache import MetadataCache
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory(prefix='podmaker_test_')
+        self.path = Path(self.tmp_dir.name) / 'metadata.sqlite3'
+        self.cache = MetadataCache(self.path, ttl=timedelta(hours=1), max_ttl=timedelta(days=7))
+        self.cache.start()
+
+    def tearDown(self) -> None:
+        self.cache.stop()
+        self.tmp_dir.cleanup()
+
+    def test_get(self) -> None:
+        self.assertIsNone(self.cache.get('video'))
+        self.cache.put('video', {'id': 'video'}, datetime.now(timezone.utc))
+        self.assertEqual({'id': 'video'}, self.cache.get('video'))
+
+    def test_persistent(self) -> None:
+        self.cache.put('video', {'id': 'video'}, datetime.now(timezone.utc))
+        self.cache.stop()
+        self.cache.start()
+        self.assertEqual({'id': 'video'}, self.cache.get('video'))
+
+    def test_ttl(self) -> None:
+        now = time.time()
+        self.cache.put('recent', {'id': 'recent'}, datetime.now(timezone.utc))
+        self.cache.put('old', {'id': 'old'}, datetime.now(timezone.utc) - timedelta(days=30))
+        with mock.patch('time.time', return_value=now + timedelta(hours=2).total_seconds()):
+            self.assertIsNone(self.cache.get('recent'))
+            self.assertEqual({'id': 'old'}, self.cache.get('old'))
+        with mock.patch('time.time', return_value=now + timedelta(days=8).total_seconds()):
+            self.assertIsNone(self.cache.get('old'))
@@ -0,0 +1,41 @@
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from podmaker.fetcher.refs import AudioRefs
+
+
+class TestAudioRefs(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory(prefix='podmaker_test_')
+        self.path = Path(self.tmp_dir.name) / 'refs.sqlite3'
+        self.refs = AudioRefs(self.path)
+        self.refs.start()
+
+    def tearDown(self) -> None:
+        self.refs.stop()
+        self.tmp_dir.cleanup()
+
+    def test_remove(self) -> None:
+        self.refs.add('key', 'a')
+        self.refs.add('key', 'a')
+        self.refs.add('key', 'b')
+        self.assertEqual({'a', 'b'}, self.refs.sources('key'))
+        self.assertEqual(1, self.refs.remove('key', 'a'))
+        self.assertEqual(1, self.refs.remove('key', 'a'))
+        self.assertEqual(0, self.refs.remove('key', 'b'))
+        self.assertEqual(set(), self.refs.sources('key'))
+
+    def test_persistent(self) -> None:
+        self.refs.add('key', 'a')
+        self.refs.stop()
+        self.refs = AudioRefs(self.path)
+        self.refs.start()
+        self.assertEqual({'a'}, self.refs.sources('key'))
+
+    def test_keys(self) -> None:
+        self.refs.add('key_1', 'a')
+        self.refs.add('key_2', 'a')
+        self.refs.add('key_2', 'b')
+        self.assertEqual({'key_1', 'key_2'}, self.refs.keys('a'))
+        self.assertEqual({'key_2'}, self.refs.keys('b'))
@@ -0,0 +1,77 @@
+import os
+import threading
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from podmaker.fetcher.work_dir import WorkDir
+
+
+class TestWorkDir(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = TemporaryDirectory(prefix='podmaker_test_')
+        self.path = Path(self.tmp_dir.name) / 'downloads'
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def write(self, name: str, size: int, age: float = 0) -> Path:
+        path = self.path / name
+        path.mkdir(parents=True)
+        (path / 'audio.part').write_bytes(b'0' * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_resume(self) -> None:
+        work_dir = WorkDir(self.path, max_size=0, max_age=0)
+        work_dir.start()
+        with self.assertRaises(ValueError), work_dir.acquire('audio') as path:
+            (path / 'audio.part').write_bytes(b'0')
+            raise ValueError
+        with work_dir.acquire('audio') as path:
+            self.assertTrue((path / 'audio.part').exists())
+        self.assertFalse(path.exists())
+
+    def test_wait(self) -> None:
+        work_dir = WorkDir(self.path, max_size=0, max_age=0)
+        work_dir.start()
+        acquired = threading.Event()
+
+        def acquire() -> None:
+            with work_dir.acquire('audio') as path:
+                self.assertTrue((path / 'audio.part').exists())
+                acquired.set()
+
+        with self.assertRaises(ValueError), work_dir.acquire('audio') as path:
+            (path / 'audio.part').write_bytes(b'0')
+            thread = threading.Thread(target=acquire)
+            thread.start()
+            # the second download waits for the one in progress, then resumes its partial files
+            self.assertFalse(acquired.wait(0.1))
+            raise ValueError
+        thread.join(1)
+        self.assertTrue(acquired.is_set())
+
+    def test_clean(self) -> None:
+        stale = self.write('stale', 1, age=100)
+        old = self.write('old', 10, age=50)
+        new = self.write('new', 10, age=10)
+        work_dir = WorkDir(self.path, max_size=15, max_age=60)
+        work_dir.start()
+        self.assertFalse(stale.exists())
+        self.assertFalse(old.exists())
+        self.assertTrue(new.exists())
+        # the active download is kept
+        with work_dir.acquire('new'):
+            work_dir.max_size = 1
+            work_dir.clean()
+            self.assertTrue(new.exists())
+
+    def test_temporary(self) -> None:
+        work_dir = WorkDir(None, max_size=0, max_age=0)
+        work_dir.start()
+        with work_dir.acquire('audio') as path:
+            self.assertTrue(path.exists())
+        self.assertFalse(path.exists())
@@ -1,13 +1,22 @@
 from __future__ import annotations
 
 import sys
+import threading
 import unittest
-from datetime import date
-from typing import IO, Any, AnyStr
+from contextlib import contextmanager
+from datetime import date, datetime
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import IO, Any, AnyStr, Iterable, Iterator
+from unittest import mock
 from urllib.parse import ParseResult, urlparse
 
-from podmaker.config import OwnerConfig, SourceConfig
-from podmaker.fetcher.youtube import YouTube
+import yt_dlp
+
+from podmaker.config import FetcherConfig, OwnerConfig, SourceConfig
+from podmaker.fetcher.audio import AudioProfile
+from podmaker.fetcher.youtube import Audio, Entry, YouTube
 from podmaker.storage import ObjectInfo, Storage
 from tests.helper import network_available
 
@@ -20,11 +29,21 @@ else:
 class MockStorage(Storage):
     cnt = 0
 
-    def put(self, data: IO[AnyStr], key: str, *, content_type: str = '') -> ParseResult:
+    def put(
+            self, data: IO[AnyStr], key: str, *, content_type: str = '', cache_control: str = ''
+    ) -> ParseResult:
         assert data.name.endswith('.mp3'), 'only mp3 is supported'
         assert self.cnt % 2 == 1, 'file already exists'
         return urlparse('https://example.com')
 
+    def put_stream(
+            self, data: IO[bytes], key: str, *, content_type: str = '', content_encoding: str = '',
+            cache_control: str = ''
+    ) -> ObjectInfo:
+        assert key.endswith('.mp3'), 'only mp3 is supported'
+        assert self.cnt % 2 == 1, 'file already exists'
+        return ObjectInfo(uri=urlparse('https://example.com'), size=len(data.read()), type=content_type)
+
     def check(self, key: str) -> ObjectInfo:
         self.cnt += 1
         return ObjectInfo(
@@ -36,6 +55,12 @@ class MockStorage(Storage):
     def get(self, key: str) -> Any:
         pass
 
+    def list_objects(self, prefix: str) -> Iterator[tuple[str, int, datetime]]:
+        return iter(())
+
+    def delete(self, keys: Iterable[str]) -> int:
+        return 0
+
 
 @unittest.skipUnless(network_available('https://www.youtube.com'), 'network is not available')
 class TestYoutube(unittest.TestCase):
@@ -81,6 +106,10 @@ class TestYoutube(unittest.TestCase):
             storage,
             OwnerConfig(name='Podmaker', email='test@podmaker.dev')
         )
+        self.youtube.start()
+
+    def tearDown(self) -> None:
+        self.youtube.stop()
 
     def test_fetch(self) -> None:
         for case in self.cases:
@@ -110,3 +139,224 @@ class TestYoutube(unittest.TestCase):
                 self.assertIsNotNone(episode.link)
                 self.assertIsNotNone(episode.image.ensure())  # type: ignore[union-attr]
                 self.assertEqual(urlparse('https://example.com'), episode.enclosure.ensure().url)
+
+
+class TestEntry(unittest.TestCase):
+    entries = [
+        {'id': 'new', 'url': 'https://www.youtube.com/watch?v=new', 'title': 'new'},
+        {'id': 'old', 'url': 'https://www.youtube.com/watch?v=old', 'title': 'old'},
+        {'id': 'older', 'url': 'https://www.youtube.com/watch?v=older'},
+    ]
+
+    @staticmethod
+    def video_info(url: str) -> dict[str, Any]:
+        video_id = url.rsplit('=', 1)[-1]
+        return {
+            'id': video_id,
+            'title': video_id,
+            'description': '',
+            'duration': 1,
+            'upload_date': {'new': '20230301', 'old': '20230201', 'older': '20230101'}[video_id],
+            'webpage_url': url,
+            'thumbnail': 'https://example.com',
+        }
+
+    def fetch_ids(
+            self,
+            url: str,
+            known_ids: frozenset[str],
+            concurrency: int = 1,
+            storage: Storage | None = None,
+            **kwargs: Any,
+    ) -> tuple[list[str | None], mock.Mock]:
+        source = SourceConfig(id='youtube', url=url, **kwargs)
+        with mock.patch('yt_dlp.YoutubeDL') as ydl_cls:
+            ydl = ydl_cls.return_value
+            ydl.extract_info.side_effect = lambda url, **_: self.video_info(url)
+            youtube = YouTube(storage or MockStorage(), None, FetcherConfig(concurrency=concurrency))
+            youtube.start()
+            entry = Entry(self.entries, youtube, source, known_ids)
+            ids = [episode.guid for episode in entry.ensure()]
+            youtube.stop()
+        return ids, ydl.extract_info
+
+    def test_stop_at_known(self) -> None:
+        ids, extract_info = self.fetch_ids('https://www.youtube.com/@PyCon2015/videos', frozenset({'old'}))
+        self.assertEqual(['new'], ids)
+        self.assertEqual(1, extract_info.call_count)
+
+    def test_skip_known(self) -> None:
+        ids, extract_info = self.fetch_ids('https://www.youtube.com/playlist?list=PL', frozenset({'old'}))
+        self.assertEqual(['new', 'older'], ids)
+        self.assertEqual(2, extract_info.call_count)
+
+    def test_concurrency(self) -> None:
+        ids, extract_info = self.fetch_ids('https://www.youtube.com/playlist?list=PL', frozenset(), 2)
+        self.assertEqual(['new', 'old', 'older'], ids)
+        self.assertEqual(3, extract_info.call_count)
+
+    def test_regex(self) -> None:
+        ids, extract_info = self.fetch_ids('https://www.youtube.com/playlist?list=PL', frozenset(), regex='^old')
+        self.assertEqual(['old', 'older'], ids)
+        # the title of the first item is filtered out before extracting, the last one has no title in the entry
+        self.assertEqual(2, extract_info.call_count)
+
+    def test_max_episodes(self) -> None:
+        ids, extract_info = self.fetch_ids('https://www.youtube.com/playlist?list=PL', frozenset(), max_episodes=1)
+        self.assertEqual(['new'], ids)
+        self.assertEqual(1, extract_info.call_count)
+
+    def test_since(self) -> None:
+        ids, _ = self.fetch_ids('https://www.youtube.com/playlist?list=PL', frozenset(), since='2023-02-01')
+        self.assertEqual(['new', 'old'], ids)
+        ids, extract_info = self.fetch_ids('https://www.youtube.com/@PyCon2015/videos', frozenset(), since='2023-03-01')
+        self.assertEqual(['new'], ids)
+        self.assertEqual(2, extract_info.call_count)
+
+    def test_window_audio(self) -> None:
+        # the audio out of the window is not checked, so that it is not queued for downloading
+        storage = MockStorage()
+        with mock.patch.object(storage, 'check', wraps=storage.check) as check:
+            self.fetch_ids('https://www.youtube.com/playlist?list=PL', frozenset(), 3, storage, max_episodes=1)
+            self.assertEqual([mock.call('youtube/youtube/new.mp3')], check.call_args_list)
+            check.reset_mock()
+            self.fetch_ids('https://www.youtube.com/playlist?list=PL', frozenset(), 3, storage, since='2023-02-01')
+            self.assertEqual(
+                {'youtube/youtube/new.mp3', 'youtube/youtube/old.mp3'}, {c.args[0] for c in check.call_args_list})
+
+    def test_rescan_unready(self) -> None:
+        storage = MockStorage()
+        source = SourceConfig(id='youtube', url='https://www.youtube.com/@PyCon2015/videos')
+        with mock.patch('yt_dlp.YoutubeDL') as ydl_cls:
+            ydl_cls.return_value.extract_info.side_effect = lambda url, **_: self.video_info(url)
+            youtube = YouTube(storage, None, FetcherConfig())
+            youtube.start()
+            self.addCleanup(youtube.stop)
+            with mock.patch.object(youtube.downloads, 'submit', return_value=True), mock.patch.object(
+                    storage, 'check', side_effect=lambda key: None if key.endswith('/old.mp3') else ObjectInfo(
+                        uri=urlparse('https://example.com'), size=0, type='audio/mp3')):
+                ids = [episode.guid for episode in Entry(self.entries, youtube, source).ensure()]
+            self.assertEqual(['new', 'older'], ids)
+            # the item older than the published ones is scanned again once its audio is downloaded
+            published = frozenset({'new', 'older'})
+            ids = [episode.guid for episode in Entry(self.entries, youtube, source, published).ensure()]
+            self.assertEqual(['old'], ids)
+            # the scan stops at the first published item again
+            published = frozenset({'new', 'old', 'older'})
+            with mock.patch.object(youtube.item_flight, 'do', wraps=youtube.item_flight.do) as do:
+                ids = [episode.guid for episode in Entry(self.entries, youtube, source, published).ensure()]
+            self.assertEqual([], ids)
+            do.assert_not_called()
+
+
+class TestCacheDir(unittest.TestCase):
+    def test_start(self) -> None:
+        with TemporaryDirectory(prefix='podmaker_test_') as state_dir, mock.patch('yt_dlp.YoutubeDL') as ydl_cls:
+            config = FetcherConfig(warm_up_url='https://www.youtube.com/watch?v=new')
+            youtube = YouTube(MockStorage(), None, config, Path(state_dir))
+            youtube.start()
+            youtube.stop()
+            cache_dir = Path(state_dir) / 'youtube' / 'cache'
+            self.assertTrue(cache_dir.is_dir())
+            ydl_cls.assert_called_once_with(youtube.ydl_opts)
+            self.assertEqual(str(cache_dir), youtube.ydl_opts['cachedir'])
+            ydl_cls.return_value.extract_info.assert_called_once_with('https://www.youtube.com/watch?v=new', download=False)
+
+
+class TestAudio(unittest.TestCase):
+    def test_audio_format(self) -> None:
+        storage = MockStorage()
+        youtube = YouTube(storage, None, FetcherConfig(audio_format='opus'))
+        info = TestEntry.video_info('https://www.youtube.com/watch?v=new')
+        for audio_format, key, content_type in (
+                (None, 'youtube/youtube/new.opus', 'audio/ogg'),
+                ('m4a', 'youtube/youtube/new.m4a', 'audio/x-m4a'),
+        ):
+            source = SourceConfig(
+                id='youtube', url='https://www.youtube.com/@PyCon2015/videos', audio_format=audio_format)
+            with mock.patch.object(storage, 'check', wraps=storage.check) as check:
+                enclosure = Audio(info, youtube, source).ensure()
+            check.assert_called_once_with(key)
+            self.assertEqual(content_type, enclosure.type)
+
+    def test_shared_audio(self) -> None:
+        storage = MockStorage()
+        youtube = YouTube(storage, None, FetcherConfig(shared_audio=True, bitrate=64))
+        youtube.refs.start()
+        self.addCleanup(youtube.refs.stop)
+        info = TestEntry.video_info('https://www.youtube.com/watch?v=new')
+        for source_id in ('channel', 'topic'):
+            source = SourceConfig(id=source_id, url='https://www.youtube.com/@PyCon2015/videos')
+            with mock.patch.object(storage, 'check', wraps=storage.check) as check:
+                Audio(info, youtube, source).ensure()
+            check.assert_called_once_with('_shared/youtube/new.64k.mp3')
+        self.assertEqual({'channel', 'topic'}, youtube.refs.sources('_shared/youtube/new.64k.mp3'))
+
+    def test_shared_download(self) -> None:
+        storage = mock.MagicMock(spec=Storage)
+        storage.get.return_value.__enter__.return_value = BytesIO(b'audio')
+        youtube = YouTube(storage, None, FetcherConfig())
+        info = TestEntry.video_info('https://www.youtube.com/watch?v=new')
+        uploading = threading.Event()
+        uploaded = ObjectInfo(uri=urlparse('https://example.com'), size=5, type='audio/mp3')
+
+        def upload(_: Audio, key: str) -> ObjectInfo:
+            uploading.set()
+            # wait for the other source to join the flight
+            threading.Event().wait(0.1)
+            return uploaded
+
+        audios = [
+            Audio(info, youtube, SourceConfig(id=source_id, url='https://www.youtube.com/@PyCon2015/videos'))
+            for source_id in ('channel', 'topic')
+        ]
+        with mock.patch.object(Audio, '_upload', side_effect=upload, autospec=True) as upload_mock:
+            thread = threading.Thread(target=audios[0].upload, args=('channel/youtube/new.mp3',))
+            thread.start()
+            uploading.wait(1)
+            audios[1].upload('topic/youtube/new.mp3')
+            thread.join(1)
+        # the audio is downloaded once, and copied to the key of the other source
+        upload_mock.assert_called_once_with(audios[0], 'channel/youtube/new.mp3')
+        storage.get.assert_called_once_with('channel/youtube/new.mp3')
+        storage.put_stream.assert_called_once_with(
+            mock.ANY, key='topic/youtube/new.mp3', content_type=audios[1].profile.mime_type)
+
+    def test_concurrent_downloads(self) -> None:
+        state_dir = TemporaryDirectory(prefix='podmaker_test_')
+        self.addCleanup(state_dir.cleanup)
+        youtube = YouTube(mock.MagicMock(spec=Storage), None, FetcherConfig(download_workers=2), Path(state_dir.name))
+        youtube.work_dir.start()
+        source = SourceConfig(id='youtube', url='https://www.youtube.com/@PyCon2015/videos')
+        barrier = threading.Barrier(2)
+        converted: dict[str, Path] = {}
+
+        def extract_info(ydl: Any, url: str, **_: Any) -> dict[str, Any]:
+            info = {**TestEntry.video_info(url), 'ext': 'webm'}
+            # both downloads are in progress before the files are written
+            barrier.wait(1)
+            path = Path(ydl.prepare_filename(info))
+            path.write_bytes(info['id'].encode())
+            return {**info, 'requested_downloads': [{'filepath': str(path)}]}
+
+        @contextmanager
+        def convert(_: AudioProfile, path: Path, codec: str | None, *, keep: bool = False) -> Iterator[IO[bytes]]:
+            converted[path.read_text()] = path
+            yield BytesIO()
+
+        audios = [
+            Audio(TestEntry.video_info(f'https://www.youtube.com/watch?v={video_id}'), youtube, source)
+            for video_id in ('new', 'old')
+        ]
+        with mock.patch.object(yt_dlp.YoutubeDL, 'extract_info', autospec=True, side_effect=extract_info), \
+                mock.patch.object(AudioProfile, 'convert', convert):
+            threads = [threading.Thread(target=audio.upload, args=(f'{audio.info["id"]}.mp3',)) for audio in audios]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(2)
+        youtube.get_download_pool(audios[0].profile).close()
+        # each download writes into its own dir of the work dir
+        self.assertEqual({'new', 'old'}, set(converted))
+        for video_id, path in converted.items():
+            self.assertTrue(path.parent.name.startswith(f'{video_id}.'))
@@ -0,0 +1,46 @@
+import unittest
+from io import BytesIO
+from unittest import mock
+from urllib.parse import urlparse
+
+from podmaker.storage import ObjectInfo, Storage
+from podmaker.storage.cache import CachedStorage
+
+
+class TestCachedStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.info = ObjectInfo(uri=urlparse('https://example.com/a.mp3'), size=1, type='audio/mp3')
+        self.backend = mock.Mock(spec=Storage)
+        self.backend.check.side_effect = lambda key: self.info if key == 'a.mp3' else None
+        self.storage = CachedStorage(self.backend, size=2, ttl=60, negative_ttl=10)
+        self.now = 0.0
+        patcher = mock.patch('podmaker.storage.cache.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_check(self) -> None:
+        for _ in range(2):
+            self.assertEqual(self.info, self.storage.check('/a.mp3'))
+            self.assertIsNone(self.storage.check('b.mp3'))
+        self.assertEqual(2, self.backend.check.call_count)
+        self.assertEqual((2, 2), (self.storage.hits, self.storage.misses))
+        # the missing object expires earlier
+        self.now = 30
+        self.storage.check('a.mp3')
+        self.storage.check('b.mp3')
+        self.assertEqual(3, self.backend.check.call_count)
+
+    def test_lru(self) -> None:
+        for key in ('a.mp3', 'b.mp3', 'a.mp3', 'c.mp3', 'a.mp3', 'b.mp3'):
+            self.storage.check(key)
+        self.assertEqual(['a.mp3', 'b.mp3', 'c.mp3', 'b.mp3'], [c.args[0] for c in self.backend.check.call_args_list])
+
+    def test_put(self) -> None:
+        self.assertIsNone(self.storage.check('b.mp3'))
+        info = ObjectInfo(uri=urlparse('https://example.com/b.mp3'), size=2, type='audio/mp3')
+        self.backend.put_stream.return_value = info
+        self.storage.put_stream(BytesIO(b'b'), '/b.mp3')
+        self.assertEqual(info, self.storage.check('b.mp3'))
+        self.storage.put(BytesIO(b'b'), 'b.mp3')
+        self.assertIsNone(self.storage.check('b.mp3'))
+        self.assertEqual(2, self.backend.check.call_count)
@@ -0,0 +1,44 @@
+import gzip
+import unittest
+from io import BytesIO
+from typing import IO, Any
+from unittest import mock
+from urllib.parse import urlparse
+
+from podmaker.storage import ObjectInfo, Storage
+from podmaker.storage.compress import CompressedStorage
+
+
+class TestCompressedStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.backend = mock.Mock(spec=Storage)
+        self.written: dict[str, tuple[bytes, str, str]] = {}
+
+        def put_stream(data: IO[bytes], key: str, *, content_type: str = '', content_encoding: str = '', **_: Any) -> Any:
+            self.written[key] = (data.read(), content_type, content_encoding)
+            return ObjectInfo(uri=urlparse(f'https://example.com/{key}'), size=0, type=content_type)
+
+        self.backend.put_stream.side_effect = put_stream
+        self.storage = CompressedStorage(self.backend, ['gzip', 'unknown'])
+
+    def test_feed(self) -> None:
+        feed = b'<rss>' + b'<item/>' * 100 + b'</rss>'
+        self.storage.put_stream(BytesIO(feed), 'feed.rss', content_type='text/xml; charset=utf-8')
+        self.assertEqual(['feed.rss.gz', 'feed.rss'], list(self.written))
+        self.assertEqual((feed, 'text/xml; charset=utf-8', ''), self.written['feed.rss'])
+        compressed, content_type, encoding = self.written['feed.rss.gz']
+        self.assertEqual(feed, gzip.decompress(compressed))
+        self.assertEqual(('text/xml; charset=utf-8', 'gzip'), (content_type, encoding))
+        self.assertLess(len(compressed), len(feed))
+        # the compression is deterministic, the ETag only changes with the feed
+        self.storage.put_stream(BytesIO(feed), 'feed.rss', content_type='text/xml; charset=utf-8')
+        self.assertEqual(compressed, self.written['feed.rss.gz'][0])
+
+    def test_audio(self) -> None:
+        self.storage.put_stream(BytesIO(b'audio'), 'a.mp3', content_type='audio/mpeg')
+        self.assertEqual(['a.mp3'], list(self.written))
+
+    def test_put(self) -> None:
+        self.storage.put(BytesIO(b'{}'), 'a.json', content_type='application/json')
+        self.assertEqual(['a.json.gz'], list(self.written))
+        self.backend.put.assert_called_once()
@@ -1,9 +1,15 @@
 import random
+import sqlite3
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
+from tempfile import TemporaryFile
+from unittest import mock
 
 from podmaker.config import LocalConfig
+from podmaker.storage import EMPTY_FILE
 from podmaker.storage.local import Local
 
 file_size = 10
@@ -44,3 +50,77 @@ class TestS3(unittest.TestCase):
     def test_check_empty(self) -> None:
         r = self.storage.check(key='/empty.bin')
         self.assertIsNone(r)
+
+    def test_get_if_changed(self) -> None:
+        info = self.storage.put_stream(self.file, key='/changed.bin')
+        with self.storage.get_if_changed('/changed.bin', info.etag) as result:
+            self.assertIsNone(result)
+        with self.storage.get_if_changed('/changed.bin', None) as result:
+            self.assertIsNotNone(result)
+            if result is not None:
+                f, etag = result
+                self.assertEqual(self.file.getvalue(), f.read())
+                self.assertEqual(info.etag, etag)
+        changed = self.storage.put_stream(BytesIO(b'changed'), key='/changed.bin')
+        with self.storage.get_if_changed('/changed.bin', info.etag) as result:
+            self.assertIsNotNone(result)
+            self.assertNotEqual(info.etag, changed.etag)
+        with self.storage.get_if_changed('/missing.bin', info.etag) as result:
+            self.assertEqual((EMPTY_FILE, None), result)
+
+    def test_durable(self) -> None:
+        self.storage.put(self.file, key='/durable.bin', content_type='application/octet-stream')
+        self.storage.stop()
+        self.storage.start()
+        info = self.storage.check('/durable.bin')
+        self.assertEqual(file_size, info.size if info else None)
+
+    def test_concurrent(self) -> None:
+        def put(i: int) -> int:
+            self.storage.put_stream(BytesIO(b'0' * i), key=f'/concurrent_{i}.bin')
+            info = self.storage.check(f'/concurrent_{i}.bin')
+            return info.size if info else -1
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            self.assertEqual(list(range(20)), list(executor.map(put, range(20))))
+
+    def test_reuse_connections(self) -> None:
+        def put(i: int) -> None:
+            self.storage.put_stream(BytesIO(b'0' * i), key=f'/reuse_{i}.bin')
+
+        with mock.patch('sqlite3.connect', wraps=sqlite3.connect) as connect:
+            # the connection opened by start is reused by the threads one after another
+            for i in range(4):
+                thread = threading.Thread(target=put, args=(i,))
+                thread.start()
+                thread.join()
+        connect.assert_not_called()
+
+    def test_copy_file(self) -> None:
+        with TemporaryFile() as f:
+            f.write(self.file.getvalue())
+            f.seek(2)
+            info = self.storage.put_stream(f, key='/copied/file.bin')
+            self.assertEqual(file_size - 2, info.size)
+            self.assertEqual(file_size, f.tell())
+        self.assertEqual(self.file.getvalue()[2:], (self.data_dir / 'copied' / 'file.bin').read_bytes())
+
+    def test_atomic(self) -> None:
+        self.storage.put_stream(BytesIO(b'old'), key='/atomic.bin')
+        broken = mock.Mock()
+        broken.read.side_effect = [b'new', OSError]
+        broken.fileno.side_effect = OSError
+        with self.assertRaises(OSError):
+            self.storage.put_stream(broken, key='/atomic.bin')
+        self.assertEqual(b'old', (self.data_dir / 'atomic.bin').read_bytes())
+        self.assertEqual([], list(self.data_dir.glob('.atomic.bin.*')))
+
+    def test_delete(self) -> None:
+        for key in ('gc/a.bin', 'gc/b.bin', 'gc_other/c.bin'):
+            self.storage.put_stream(BytesIO(b'0'), key=key)
+        listed = {key: size for key, size, _ in self.storage.list_objects('/gc/')}
+        self.assertEqual({'gc/a.bin': 1, 'gc/b.bin': 1}, listed)
+        self.assertEqual(2, self.storage.delete(['/gc/a.bin', 'gc/b.bin', 'gc/missing.bin']))
+        self.assertEqual([], list(self.storage.list_objects('gc/')))
+        self.assertFalse((self.data_dir / 'gc' / 'a.bin').exists())
+        self.assertIsNotNone(self.storage.check('gc_other/c.bin'))
@@ -1,8 +1,13 @@
+import base64
+import hashlib
 import random
+import time
 import unittest
 from dataclasses import dataclass
+from datetime import datetime
 from io import BytesIO
 from typing import Any, Type
+from unittest import mock
 from unittest.mock import patch
 from urllib.parse import ParseResult, urlparse
 
@@ -13,6 +18,7 @@ from podmaker.config import S3Config
 from podmaker.storage.s3 import S3
 
 file_size = 10
+part_size = 5 * 1024 * 1024
 
 
 @dataclass
@@ -34,8 +40,50 @@ class MockedBucket:
         return MockedObject(content_type='application/octet-stream', content_length=file_size)
 
 
+class MockedClient:
+    def __init__(self) -> None:
+        self.parts: dict[int, bytes] = {}
+        self.completed: list[dict[str, Any]] = []
+        self.pages: list[dict[str, Any]] = []
+        self.failures = 0
+        self.deletes: list[list[str]] = []
+
+    @staticmethod
+    def create_multipart_upload(**_: Any) -> dict[str, Any]:
+        return {'UploadId': 'upload'}
+
+    def upload_part(self, *, PartNumber: int, Body: bytes, ContentMD5: str, **__: Any) -> dict[str, Any]:
+        if self.failures > 0:
+            self.failures -= 1
+            raise ClientError(error_response={}, operation_name='UploadPart')
+        assert ContentMD5 == base64.b64encode(hashlib.md5(Body).digest()).decode()
+        self.parts[PartNumber] = Body
+        return {'ETag': str(PartNumber)}
+
+    def get_paginator(self, _: str) -> Any:
+        paginator = mock.Mock()
+        paginator.paginate.side_effect = lambda **__: iter(self.pages)
+        return paginator
+
+    def delete_objects(self, *, Delete: dict[str, Any], **__: Any) -> dict[str, Any]:
+        keys = [obj['Key'] for obj in Delete['Objects']]
+        self.deletes.append(keys)
+        return {'Errors': [{'Key': key, 'Code': 'AccessDenied'} for key in keys if key.startswith('denied')]}
+
+    def complete_multipart_upload(self, *, MultipartUpload: dict[str, Any], **__: Any) -> dict[str, Any]:
+        self.completed = MultipartUpload['Parts']
+        return {'ETag': '"multipart-3"'}
+
+
+@dataclass
+class MockedMeta:
+    client: MockedClient
+
+
 # noinspection PyPep8Naming
 class MockedServiceResource:
+    meta = MockedMeta(MockedClient())
+
     @staticmethod
     def Bucket(*_: Any, **__: Any) -> MockedBucket:
         return MockedBucket()
@@ -55,9 +103,15 @@ class TestS3(unittest.TestCase):
                 access_secret='456',
                 bucket='podmaker',
                 endpoint='http://localhost:9000',
-                public_endpoint='http://localhost:9000'
+                public_endpoint='http://localhost:9000',
+                multipart_threshold=part_size,
+                multipart_chunk_size=part_size,
+                index_ttl=0,
+                cache_control={'*/feed.rss*': 'max-age=300', '*.mp3': 'max-age=31536000, immutable'},
             )
         )
+        self.client = MockedClient()
+        self.s3.s3.meta.client = self.client  # type: ignore[assignment]
         self.file = BytesIO()
         self.file.write(random.randbytes(file_size))
         self.file.seek(0)
@@ -76,3 +130,98 @@ class TestS3(unittest.TestCase):
     def test_check_empty(self) -> None:
         r = self.s3.check(key='/empty.bin')
         self.assertIsNone(r)
+
+    def test_multipart(self) -> None:
+        data = random.randbytes(part_size * 2 + 10)
+        self.client.failures = 2
+        with patch('time.sleep'):
+            info = self.s3.put_stream(BytesIO(data), key='/test.bin', content_type='application/octet-stream')
+        self.assertEqual(len(data), info.size)
+        self.assertEqual([1, 2, 3], [part['PartNumber'] for part in self.client.completed])
+        self.assertEqual(data, b''.join(self.client.parts[i] for i in range(1, 4)))
+
+    def test_stream_small(self) -> None:
+        with patch.object(MockedBucket, 'put_object') as put_object:
+            info = self.s3.put_stream(BytesIO(b'data'), key='/test.bin')
+        self.assertEqual(4, info.size)
+        put_object.assert_called_once()
+        self.assertEqual({}, self.client.parts)
+
+    def test_content_encoding(self) -> None:
+        with patch.object(MockedBucket, 'put_object') as put_object:
+            self.s3.put_stream(BytesIO(b'feed'), key='/feed.rss.gz', content_type='text/xml', content_encoding='gzip')
+            self.s3.put_stream(BytesIO(b'feed'), key='/feed.rss', content_type='text/xml')
+        self.assertEqual('gzip', put_object.call_args_list[0].kwargs['ContentEncoding'])
+        self.assertNotIn('ContentEncoding', put_object.call_args_list[1].kwargs)
+
+    def test_cache_control(self) -> None:
+        with patch.object(MockedBucket, 'put_object') as put_object:
+            self.s3.put_stream(BytesIO(b'audio'), key='/source/youtube/a.mp3', content_type='audio/mpeg')
+            self.s3.put(BytesIO(b'feed'), key='source/feed.rss', content_type='text/xml')
+            self.s3.put_stream(BytesIO(b'feed'), key='/source/feed.rss.gz', content_encoding='gzip')
+            self.s3.put_stream(BytesIO(b'data'), key='/a.bin')
+            self.s3.put_stream(BytesIO(b'data'), key='/b.bin', cache_control='no-cache')
+        self.assertEqual(
+            ['max-age=31536000, immutable', 'max-age=300', 'max-age=300', None, 'no-cache'],
+            [c.kwargs.get('CacheControl') for c in put_object.call_args_list],
+        )
+
+    def test_put_multipart(self) -> None:
+        data = BytesIO(random.randbytes(part_size + 10))
+        with patch.object(MockedBucket, 'put_object') as put_object:
+            self.s3.put(data, key='/test.bin')
+        put_object.assert_not_called()
+        self.assertEqual(0, data.tell())
+        self.assertEqual(data.getvalue(), self.client.parts[1] + self.client.parts[2])
+
+    def test_index(self) -> None:
+        self.s3.index_ttl = 60
+        self.client.pages = [
+            {'Contents': [{'Key': 'source/a.mp3', 'Size': 1}]},
+            {'Contents': [{'Key': 'source/b.mp3', 'Size': 2}]},
+        ]
+        with patch.object(MockedBucket, 'Object') as head, patch.object(self.client, 'get_paginator',
+                                                                        wraps=self.client.get_paginator) as paginator:
+            a = self.s3.check('source/a.mp3')
+            b = self.s3.check('/source/b.mp3')
+            self.assertIsNone(self.s3.check('source/c.mp3'))
+            self.s3.put_stream(BytesIO(b'data'), key='source/c.mp3', content_type='audio/mp3')
+            c = self.s3.check('source/c.mp3')
+        head.assert_not_called()
+        paginator.assert_called_once()
+        self.assertEqual((1, 'audio/mpeg'), (a.size, a.type) if a else None)
+        self.assertEqual(2, b.size if b else None)
+        self.assertEqual((4, 'audio/mp3'), (c.size, c.type) if c else None)
+        # the prefix is listed again after the TTL
+        with patch.object(self.client, 'get_paginator', wraps=self.client.get_paginator) as paginator, \
+                patch('podmaker.storage.s3.monotonic', return_value=time.monotonic() + 61):
+            self.s3.check('source/a.mp3')
+        paginator.assert_called_once()
+
+    def test_get_if_changed(self) -> None:
+        obj = mock.Mock()
+        obj.get.return_value = {'Body': BytesIO(b'feed'), 'ETag': '"etag"'}
+        with patch.object(MockedBucket, 'Object', return_value=obj):
+            info = self.s3.put_stream(BytesIO(b'feed'), key='/feed.rss')
+            self.assertEqual(f'"{hashlib.md5(b"feed").hexdigest()}"', info.etag)
+            with self.s3.get_if_changed('/feed.rss', None) as result:
+                self.assertEqual((b'feed', '"etag"'), (result[0].read(), result[1]) if result else None)
+            obj.get.assert_called_once_with()
+            obj.get.side_effect = ClientError(error_response={'Error': {'Code': '304'}}, operation_name='GetObject')
+            with self.s3.get_if_changed('/feed.rss', '"etag"') as result:
+                self.assertIsNone(result)
+            obj.get.assert_called_with(IfNoneMatch='"etag"')
+            obj.get.reset_mock()
+            # the feed written by itself is not requested in the single writer mode
+            self.s3.single_writer = True
+            info = self.s3.put_stream(BytesIO(b'feed'), key='/feed.rss')
+            with self.s3.get_if_changed('/feed.rss', info.etag) as result:
+                self.assertIsNone(result)
+            obj.get.assert_not_called()
+
+    def test_delete(self) -> None:
+        self.client.pages = [{'Contents': [{'Key': 'source/a.mp3', 'Size': 1, 'LastModified': datetime(2020, 1, 1)}]}]
+        self.assertEqual([('source/a.mp3', 1, datetime(2020, 1, 1))], list(self.s3.list_objects('/source/')))
+        keys = [f'source/{i}.mp3' for i in range(2500)] + ['denied.mp3']
+        self.assertEqual(2500, self.s3.delete(keys))
+        self.assertEqual([1000, 1000, 501], [len(batch) for batch in self.client.deletes])
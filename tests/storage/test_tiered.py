@@ -0,0 +1,86 @@
+import unittest
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from podmaker.config import LocalConfig
+from podmaker.storage import EMPTY_FILE
+from podmaker.storage.local import Local
+from podmaker.storage.tiered import TieredStorage
+
+
+def create_local(base_dir: Path) -> Local:
+    return Local(LocalConfig(dest='local', base_dir=base_dir, public_endpoint='http://localhost:9000'))
+
+
+class TestTieredStorage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = TemporaryDirectory()
+        self.origin = create_local(Path(self.dir.name) / 'origin')
+        self.cache = create_local(Path(self.dir.name) / 'cache')
+        self.storage = TieredStorage(self.origin, self.cache, 16 * 10)
+        self.storage.start()
+
+    def tearDown(self) -> None:
+        self.storage.stop()
+        self.dir.cleanup()
+
+    def test_write_through(self) -> None:
+        info = self.storage.put_stream(BytesIO(b'0' * 10), key='/a.bin', content_type='audio/mpeg')
+        self.assertEqual(10, info.size)
+        self.assertEqual(10, self.origin.check('a.bin').size)  # type: ignore[union-attr]
+        self.assertEqual('audio/mpeg', self.cache.check('a.bin').type)  # type: ignore[union-attr]
+        self.storage.put(BytesIO(b'1' * 5), key='/b.bin')
+        self.assertEqual(5, self.origin.check('b.bin').size)  # type: ignore[union-attr]
+        self.assertEqual(5, self.cache.check('b.bin').size)  # type: ignore[union-attr]
+
+    def test_etag(self) -> None:
+        info = self.storage.put_stream(BytesIO(b'0' * 10), key='/etag.bin')
+        # the object is read from the cache, so the etag is the one of the cache
+        with self.storage.get_if_changed('/etag.bin', info.etag) as result:
+            self.assertIsNone(result)
+
+    def test_large(self) -> None:
+        self.storage.put_stream(BytesIO(b'0' * 10), key='/large.bin')
+        self.storage.put_stream(BytesIO(b'1' * 25), key='/large.bin')
+        self.assertIsNone(self.cache.check('large.bin'))
+        with self.storage.get('/large.bin') as f:
+            self.assertEqual(b'1' * 25, f.read())
+
+    def test_read_through(self) -> None:
+        self.origin.put_stream(BytesIO(b'origin'), key='read.bin', content_type='text/plain')
+        self.assertIsNone(self.cache.check('read.bin'))
+        with self.storage.get('/read.bin') as f:
+            self.assertEqual(b'origin', f.read())
+        self.assertEqual('text/plain', self.cache.check('read.bin').type)  # type: ignore[union-attr]
+        with self.storage.get_if_changed('/read.bin', None) as result:
+            self.assertIsNotNone(result)
+            if result is not None:
+                etag = result[1]
+        with self.storage.get_if_changed('/read.bin', etag) as result:
+            self.assertIsNone(result)
+        with self.storage.get('/missing.bin') as f:
+            self.assertIs(EMPTY_FILE, f)
+
+    def test_evict(self) -> None:
+        for i in range(20):
+            self.storage.put_stream(BytesIO(b'0' * 10), key=f'/{i}.bin')
+            # keep the first one in use
+            self.storage.check('/0.bin')
+        self.assertIsNotNone(self.cache.check('0.bin'))
+        self.assertIsNone(self.cache.check('1.bin'))
+        self.assertEqual(16, len(self.cache.files()))
+        self.assertEqual(20, len(self.origin.files()))
+
+    def test_recover(self) -> None:
+        self.storage.put_stream(BytesIO(b'0' * 10), key='/kept.bin')
+        self.storage.put_stream(BytesIO(b'0' * 10), key='/lost.bin')
+        self.storage.stop()
+        (self.cache.data_dir / 'lost.bin').unlink()
+        (self.cache.data_dir / 'untracked.bin').write_bytes(b'0')
+        self.storage.start()
+        self.assertIsNotNone(self.cache.check('kept.bin'))
+        self.assertIsNone(self.cache.check('lost.bin'))
+        self.assertFalse((self.cache.data_dir / 'untracked.bin').exists())
+        with self.storage.get('/lost.bin') as f:
+            self.assertEqual(b'0' * 10, f.read())
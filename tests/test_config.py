@@ -2,7 +2,9 @@ import sys
 import unittest
 from pathlib import Path
 
-from podmaker.config import PMConfig
+from pydantic import ValidationError
+
+from podmaker.config import PMConfig, SourceConfig
 
 if sys.version_info >= (3, 11):
     import tomllib as toml
@@ -17,3 +19,15 @@ class TestConfig(unittest.TestCase):
     def test_from_file(self) -> None:
         config = PMConfig.from_file(self.path)
         self.assertEqual(toml.loads(self.path.read_text()), config.model_dump(mode='json'))
+
+    def test_reserved_source_id(self) -> None:
+        with self.assertRaises(ValidationError):
+            SourceConfig(id='_shared', url='https://www.youtube.com/@PyCon2015/videos')
+
+    def test_gc_of_shared_audio(self) -> None:
+        data = toml.loads(self.path.read_text())
+        del data['app']['state_dir']
+        data['fetcher']['shared_audio'] = True
+        data['gc']['enabled'] = True
+        with self.assertRaises(ValidationError):
+            PMConfig(**data)
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import math
 import unittest
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from email.utils import parsedate_to_datetime
 from pathlib import Path
 from typing import Any, Callable
@@ -277,3 +277,19 @@ class TestRSS(unittest.TestCase):
                     self.assertEqual(ar, br, f'{field} is not merged: {value}')
                 else:
                     self.assertEqual(getattr(ap, field), value, f'{field} is not merged: {value}')
+
+    def test_merge_bounded(self) -> None:
+        for doc in self.rss_docs:
+            ap = Podcast.from_rss(doc)
+            bp = Podcast.from_rss(doc)
+            items = sorted(ap.items.ensure(), key=lambda i: i.pub_date or 0, reverse=True)
+            self.assertTrue(ap.merge(bp, max_items=1))
+            self.assertEqual([items[0]], list(ap.items.ensure()))
+            self.assertFalse(ap.merge(bp, max_items=1))
+
+            ap = Podcast.from_rss(doc)
+            last_pub_date = items[-1].pub_date
+            assert last_pub_date is not None
+            since = last_pub_date + timedelta(seconds=1)
+            self.assertTrue(ap.merge(bp, since=since))
+            self.assertEqual(items[:-1], list(ap.items.ensure()))
@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from podmaker.util import JobQueue
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self) -> None:
+        self.hook = mock.Mock()
+        self.queue = JobQueue('test', 2, 'priority', self.hook)
+        self.queue.start()
+        self.block = threading.Event()
+
+    def tearDown(self) -> None:
+        self.block.set()
+        self.queue.stop()
+
+    def wait(self) -> None:
+        self.block.wait()
+
+    def test_order(self) -> None:
+        done: list[str] = []
+        for key in ('blocker_1', 'blocker_2'):
+            self.queue.submit(key, self.wait, group='blocker', priority=10)
+        for key, priority in (('low', 0), ('high', 1), ('middle', 0)):
+            func = mock.Mock(side_effect=lambda k=key: done.append(k))
+            self.queue.submit(key, func, group='test', limit=1, priority=priority)
+        self.block.set()
+        self.queue.join()
+        self.assertEqual(['high', 'low', 'middle'], done)
+        self.hook.assert_any_call('test', 3)
+        self.hook.assert_any_call('blocker', 2)
+
+    def test_deduplicate(self) -> None:
+        func = mock.Mock()
+        self.assertTrue(self.queue.submit('key', self.wait, group='test'))
+        self.assertFalse(self.queue.submit('key', func, group='test'))
+        self.block.set()
+        self.queue.join()
+        self.assertEqual(0, func.call_count)
+
+    def test_group_limit(self) -> None:
+        running = 0
+        max_running = 0
+        lock = threading.Lock()
+
+        def job() -> None:
+            nonlocal running, max_running
+            with lock:
+                running += 1
+                max_running = max(max_running, running)
+            time.sleep(0.01)
+            with lock:
+                running -= 1
+
+        for i in range(5):
+            self.queue.submit(str(i), job, group='test', limit=1)
+        self.queue.join()
+        self.assertEqual(1, max_running)
+
+    def test_failed(self) -> None:
+        self.queue.submit('failed', mock.Mock(side_effect=ValueError), group='test')
+        self.queue.join()
+        self.hook.assert_called_once_with('test', 0)
@@ -0,0 +1,67 @@
+import threading
+import unittest
+from unittest import mock
+
+from podmaker.util import Pool
+from podmaker.util.pool import PoolClosedError
+
+
+class TestPool(unittest.TestCase):
+    def setUp(self) -> None:
+        self.factory = mock.Mock(side_effect=object)
+        self.finalizer = mock.Mock()
+        self.pool: Pool[object] = Pool(self.factory, self.finalizer)
+        self.pool.open()
+
+    def test_reuse(self) -> None:
+        with self.pool.acquire() as a:
+            pass
+        with self.pool.acquire() as b:
+            self.assertIs(a, b)
+        self.assertEqual(1, self.factory.call_count)
+
+    def test_concurrent_acquire(self) -> None:
+        with self.pool.acquire() as a, self.pool.acquire() as b:
+            self.assertIsNot(a, b)
+        self.assertEqual(2, self.factory.call_count)
+
+    def test_close(self) -> None:
+        with self.pool.acquire():
+            with self.pool.acquire():
+                pass
+            self.pool.close()
+            self.assertEqual(1, self.finalizer.call_count)
+        self.assertEqual(2, self.finalizer.call_count)
+        with self.assertRaises(PoolClosedError):
+            with self.pool.acquire():
+                pass
+
+    def test_max_size(self) -> None:
+        pool: Pool[object] = Pool(self.factory, max_size=1)
+        pool.open()
+        acquired = threading.Event()
+
+        def acquire() -> None:
+            with pool.acquire():
+                acquired.set()
+
+        with pool.acquire() as a:
+            thread = threading.Thread(target=acquire)
+            thread.start()
+            # the second caller waits for the only object
+            self.assertFalse(acquired.wait(0.1))
+        thread.join(1)
+        self.assertTrue(acquired.is_set())
+        self.assertEqual(1, self.factory.call_count)
+        with pool.acquire() as b:
+            self.assertIs(a, b)
+
+    def test_factory_error(self) -> None:
+        pool: Pool[object] = Pool(mock.Mock(side_effect=[ValueError, object()]), max_size=1)
+        pool.open()
+        with self.assertRaises(ValueError):
+            with pool.acquire():
+                pass
+        # the failed creation does not take the slot
+        with pool.acquire():
+            pass
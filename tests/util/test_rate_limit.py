@@ -0,0 +1,55 @@
+import unittest
+from unittest import mock
+
+from podmaker.util import RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+
+        def sleep(seconds: float) -> None:
+            # a real sleep overshoots a little, the tokens would never reach 1 due to rounding errors otherwise
+            self.now += seconds + 1e-9
+
+        patcher = mock.patch.multiple(
+            'podmaker.util.rate_limit',
+            monotonic=mock.Mock(side_effect=lambda: self.now),
+            sleep=mock.Mock(side_effect=sleep),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst(self) -> None:
+        limiter = RateLimiter('test', rate=2, burst=3)
+        for _ in range(3):
+            limiter.acquire()
+        self.assertEqual(0, self.now)
+        limiter.acquire()
+        self.assertAlmostEqual(0.5, self.now)
+        limiter.acquire()
+        self.assertAlmostEqual(1, self.now)
+
+    def test_unlimited(self) -> None:
+        limiter = RateLimiter('test', rate=0, burst=1)
+        for _ in range(10):
+            limiter.acquire()
+        self.assertEqual(0, self.now)
+
+    def test_aimd(self) -> None:
+        limiter = RateLimiter('test', rate=4, burst=1, min_rate=1)
+        with self.assertRaises(ValueError), limiter.limit(lambda e: isinstance(e, ValueError)):
+            raise ValueError
+        self.assertEqual(2, limiter.rate)
+        limiter.on_throttled()
+        limiter.on_throttled()
+        self.assertEqual(1, limiter.rate)
+        with self.assertRaises(KeyError), limiter.limit(lambda e: isinstance(e, ValueError)):
+            raise KeyError
+        self.assertEqual(1, limiter.rate)
+        for _ in range(100):
+            with limiter.limit(lambda _: False):
+                pass
+        self.assertAlmostEqual(4, limiter.rate)
+        limiter.on_success()
+        self.assertEqual(4, limiter.rate)
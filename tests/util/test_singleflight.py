@@ -0,0 +1,55 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Iterator
+from unittest import mock
+
+from podmaker.util import SharedIterable, SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_share(self) -> None:
+        flight: SingleFlight[int] = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+
+        def func() -> int:
+            started.set()
+            release.wait()
+            return 1
+
+        func_mock = mock.Mock(side_effect=func)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flight.do, 'key', func_mock)
+            started.wait()
+            follower = executor.submit(flight.do, 'key', func_mock)
+            # the follower has no way to signal that it is waiting, wait for it to block
+            self.assertRaises(TimeoutError, follower.result, timeout=0.1)
+            release.set()
+            self.assertEqual(1, leader.result())
+            self.assertEqual(1, follower.result())
+        func_mock.assert_called_once()
+        # the result is not kept after the flight
+        self.assertEqual(2, flight.do('key', lambda: 2))
+
+    def test_error(self) -> None:
+        flight: SingleFlight[int] = SingleFlight()
+        self.assertRaises(ValueError, flight.do, 'key', mock.Mock(side_effect=ValueError))
+        self.assertEqual(1, flight.do('key', lambda: 1))
+
+
+class TestSharedIterable(unittest.TestCase):
+    def test_iterate(self) -> None:
+        pulled = []
+
+        def generate() -> Iterator[int]:
+            for i in range(3):
+                pulled.append(i)
+                yield i
+
+        shared = SharedIterable(generate())
+        first, second = iter(shared), iter(shared)
+        self.assertEqual(0, next(first))
+        self.assertEqual([0, 1, 2], list(second))
+        self.assertEqual([1, 2], list(first))
+        self.assertEqual([0, 1, 2], pulled)